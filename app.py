@@ -1,12 +1,13 @@
 
 import streamlit as st
+from utils.auth import current_user
 st.set_page_config(
     page_title="Koral Listeria Dashboard",
     layout="wide",
     initial_sidebar_state="expanded"
 )
 
-if "user" not in st.session_state:
+if current_user() is None:
     st.warning("Please login first.")
     st.stop()
     
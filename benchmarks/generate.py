@@ -0,0 +1,121 @@
+
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# 🧪 Synthetic Listeria swab results matching the upload schema, for benchmarks.
+#   KORAL_DB_NAME=koral_bench python -m benchmarks.generate --rows 100000 --drop
+# Never point --drop at the production database: it empties the result and rollup collections.
+
+IMAGE_SIZE = (1600, 1000)
+SUB_AREAS = ["Filleting", "Slicing", "Packing", "Smoking", "Brining", "Cold Storage", "Dispatch"]
+TESTS = ["Listeria spp.", "Listeria monocytogenes"]
+BEFORE_DURING = ["Before", "During"]
+
+
+def sampling_points(n_points, seed=0):
+    """Fixed swab points on the floor plan: id, zone code, sub-area, x, y and base positive rate."""
+    rng = np.random.default_rng(seed)
+    return {
+        "points": np.array([f"P{i + 1:04d}" for i in range(n_points)]),
+        "code": np.array([f"K{c:02d}" for c in rng.integers(1, 41, n_points)]),
+        "sub_area": rng.choice(SUB_AREAS, n_points),
+        "x": rng.integers(20, IMAGE_SIZE[0] - 20, n_points),
+        "y": rng.integers(20, IMAGE_SIZE[1] - 20, n_points),
+        # A few hotspots carry most positives
+        "risk": np.where(rng.random(n_points) < 0.05, 0.25, 0.02),
+    }
+
+
+def generate(rows, n_points=400, days=365, start=datetime(2024, 1, 1), seed=0, batch_size=10000):
+    """Yield batches of (result documents, map documents) totalling `rows` results."""
+    rng = np.random.default_rng(seed)
+    points = sampling_points(n_points, seed)
+    produced = 0
+    while produced < rows:
+        n = min(batch_size, rows - produced)
+        idx = rng.integers(0, n_points, n)
+        day = np.sort(rng.integers(0, days, n))
+        positive = rng.random(n) < points["risk"][idx]
+        results, mapped = [], []
+        for i in range(n):
+            row = produced + i
+            sample_date = start + timedelta(days=int(day[i]))
+            iso = sample_date.isocalendar()
+            point = points["points"][idx[i]]
+            value = "Detected" if positive[i] else "Not Detected"
+            description = f"{points['sub_area'][idx[i]]} surface {point}"
+            results.append({
+                "sample_code": f"S{row:08d}",
+                "sample_description": description,
+                "translated_description": description,
+                "test_code": "LIS" if i % 2 else "LMO",
+                "test_result": value,
+                "unit": "/25 cm2",
+                "analytical_report_code": f"AR{sample_date:%Y%m%d}",
+                "sample_date": sample_date,
+                "location_code": points["code"][idx[i]],
+                "fresh_smoked": "Smoked" if points["sub_area"][idx[i]] == "Smoking" else "Fresh",
+                "sub_area": points["sub_area"][idx[i]],
+                "before_during": BEFORE_DURING[i % 2],
+                "value": value,
+                "week_num": iso[1],
+                "week": f"{iso[0]}-W{iso[1]:02d}",
+                "x": int(points["x"][idx[i]]),
+                "y": int(points["y"][idx[i]]),
+                "points": point,
+                "code": points["code"][idx[i]],
+                "test": TESTS[i % 2],
+            })
+            mapped.append({
+                "points": point,
+                "x": int(points["x"][idx[i]]),
+                "y": int(points["y"][idx[i]]),
+                "values": int(positive[i]),
+                "description": description,
+                "sample_date": sample_date,
+            })
+        produced += n
+        yield results, mapped
+
+
+def load(rows, n_points=400, days=365, seed=0, drop=False):
+    """Write a synthetic dataset into the configured database; returns rows written.
+
+    The daily rollup gets the same counts the upload path would add, so it is complete
+    after a `drop` load without a server-side rebuild.
+    """
+    from collections import Counter
+
+    from utils import rollups
+    from utils.db import MAP_COLLECTION, RESULTS_COLLECTION, ROLLUP_COLLECTION, get_collection
+
+    if drop:
+        for name in (RESULTS_COLLECTION, MAP_COLLECTION, ROLLUP_COLLECTION):
+            get_collection(name).delete_many({})
+    deltas = Counter()
+    for results, mapped in generate(rows, n_points, days, seed=seed):
+        get_collection(RESULTS_COLLECTION).insert_many(results, ordered=False)
+        get_collection(MAP_COLLECTION).insert_many(mapped, ordered=False)
+        deltas.update(rollups.count_changes(results))
+    if drop:
+        # The rollup started empty, so the summed counts are the whole collection
+        counts = [{**dict(zip(rollups.KEY_FIELDS, key)), "count": n} for key, n in deltas.items() if n]
+        if counts:
+            get_collection(ROLLUP_COLLECTION).insert_many(counts, ordered=False)
+        rollups.mark_complete()
+    else:
+        rollups.apply_changes(deltas)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a synthetic Listeria dataset")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--points", type=int, default=400)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--drop", action="store_true", help="empty the result collections first")
+    args = parser.parse_args()
+    print(f"Loaded {load(args.rows, args.points, args.days, args.seed, args.drop)} rows")
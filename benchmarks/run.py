@@ -0,0 +1,160 @@
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+# ⏱️ Headless benchmarks of the dashboard hot paths (no browser, no Streamlit).
+#   python -m benchmarks.run --rows 10000 --backend mongomock
+#   python -m benchmarks.run --rows 1000000 --backend mongod --baseline benchmarks/results/<run>.json
+# Runs against a dedicated `koral_bench` database unless KORAL_DB_NAME is set.
+# Each run is written to benchmarks/results/; with --baseline, any benchmark slower than
+# the baseline by more than --tolerance makes the command exit non-zero.
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _configure(backend):
+    os.environ.setdefault("KORAL_DB_NAME", "koral_bench")
+    if backend == "mongomock":
+        os.environ["MONGO_URI"] = "mongomock://"
+    # Keep page code paths from polling or watching while we time them
+    os.environ["KORAL_CHANGE_STREAM"] = "0"
+    # Cold loads must scan the database; the snapshot path is timed separately
+    os.environ["KORAL_SNAPSHOT_DIR"] = ""
+
+
+def _time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": round(statistics.median(timings), 2), "min_ms": round(min(timings), 2)}
+
+
+def benchmarks():
+    """(name, callable) pairs mirroring what each page does on a cold and a warm visit."""
+    import tempfile
+
+    import pandas as pd
+    from utils import aggregations, data, rollups
+    from utils.data import results, filter_dates, map_dates, load_map_window
+    from utils.map_history import PointHistory
+
+    def cold_load():
+        results.frame = None
+        results.last_id = results.last_uploaded_at = None
+        results.get()
+
+    snapshot_dir = tempfile.mkdtemp(prefix="koral-bench-")
+
+    def snapshot_start():
+        data.SNAPSHOT_DIR = snapshot_dir
+        try:
+            if not os.listdir(snapshot_dir):
+                results._save_snapshot()
+            results.frame = None
+            results.get()
+        finally:
+            data.SNAPSHOT_DIR = ""
+
+    # Time the computations themselves, not hits in the shared result cache
+    date_bounds = aggregations.date_bounds.__wrapped__
+    counts_by_date_outcome = aggregations.counts_by_date_outcome.__wrapped__
+    counts_by_code_value = aggregations.counts_by_code_value.__wrapped__
+    detections_by_test = aggregations.detections_by_test.__wrapped__
+    distinct_map_dates = map_dates.__wrapped__
+    map_window = load_map_window.__wrapped__
+
+    end = date_bounds(engine="pandas")[1]
+    start = end - pd.Timedelta(days=90)
+    latest = distinct_map_dates()[0]
+    window = map_window(latest, 15)
+    return [
+        ("data: cold load of shared frame", cold_load),
+        ("data: cold start from Parquet snapshot", snapshot_start),
+        ("data: filter quarter (pandas)", lambda: filter_dates(results.get(), start, end)),
+        ("overview: date bounds (mongo)", lambda: date_bounds(engine="mongo")),
+        ("overview: counts by date (mongo)", lambda: counts_by_date_outcome(start, end, engine="mongo")),
+        ("overview: counts by date (rollup)", lambda: counts_by_date_outcome(start, end, engine="rollup")),
+        ("overview: counts by date (pandas)", lambda: counts_by_date_outcome(start, end, engine="pandas")),
+        ("visuals: counts by code (mongo)", lambda: counts_by_code_value(start, end, engine="mongo")),
+        ("visuals: counts by code (pandas)", lambda: counts_by_code_value(start, end, engine="pandas")),
+        ("summary: detections by test (mongo)", lambda: detections_by_test(engine="mongo")),
+        ("summary: detections by test (pandas)", lambda: detections_by_test(engine="pandas")),
+        ("map: distinct dates", distinct_map_dates),
+        ("map: 15-day window", lambda: map_window(latest, 15)),
+        ("map: history for date", lambda: PointHistory(window).for_date(latest)),
+        ("rollup: rebuild", rollups.rebuild),
+    ]
+
+
+def run(rows, backend, repeat, only=None):
+    _configure(backend)
+    from benchmarks.generate import load
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "rows": rows,
+        "backend": backend,
+        "results": {},
+    }
+    # load() also maintains the daily rollup, so the rollup engine works on every backend
+    report["results"]["setup: generate + insert"] = _time(lambda: load(rows, drop=True), 1)
+    for name, func in benchmarks():
+        if only and only not in name:
+            continue
+        try:
+            report["results"][name] = _time(func, repeat)
+        except Exception as e:  # e.g. an operator mongomock does not implement
+            report["results"][name] = {"error": f"{type(e).__name__}: {e}"}
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Names of benchmarks slower than `baseline` by more than `tolerance` (a fraction)."""
+    regressions = []
+    for name, result in report["results"].items():
+        before = baseline["results"].get(name, {})
+        if "median_ms" in result and "median_ms" in before and before["median_ms"] > 0:
+            if result["median_ms"] > before["median_ms"] * (1 + tolerance):
+                regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard data paths")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--backend", choices=["mongomock", "mongod"], default="mongomock")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="run benchmarks whose name contains this text")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = run(args.rows, args.backend, args.repeat, args.only)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{report['timestamp'].replace(':', '')}-{args.backend}-{args.rows}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    width = max(len(name) for name in report["results"])
+    for name, result in report["results"].items():
+        value = result.get("error") or f"{result['median_ms']:>10.2f} ms (min {result['min_ms']:.2f})"
+        print(f"{name:<{width}}  {value}")
+    print(f"\nSaved {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name in regressions:
+            print(f"REGRESSION: {name}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
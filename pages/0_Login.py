@@ -1,5 +1,6 @@
 import streamlit as st
-from utils.auth import authenticate  # Assuming authenticate is in utils/auth.py
+from utils.auth import authenticate, LoginBusy, LoginThrottled  # Assuming authenticate is in utils/auth.py
+from utils.prefetch import start_prefetch
 
 st.title("🔐 Login")
 
@@ -7,9 +8,14 @@ username = st.text_input("Username")
 password = st.text_input("Password", type="password")
 
 if st.button("Login"):
-    user = authenticate(username, password)
+    try:
+        user = authenticate(username, password)
+    except (LoginThrottled, LoginBusy) as e:
+        st.error(str(e))
+        st.stop()
     if user:
         st.session_state["user"] = user
+        start_prefetch()  # warm every page's data while the overview loads
         st.success(f"Welcome, {user['username']}!")
         st.switch_page("1_Overview_Dashboard.py")  # You can customize this path
     else:
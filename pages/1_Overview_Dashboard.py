@@ -1,12 +1,17 @@
 import streamlit as st
 # ✅ Set page config FIRST
 st.set_page_config(page_title="Overview Dashboard", layout="wide")
-import pandas as pd
 import plotly.express as px
-from utils.db import listeria_collection
+from utils.aggregations import date_bounds, counts_by_date_outcome, detection_rate, summary_by_code
+from utils.export import export_controls
+from utils.timing import span
+from utils.timebuckets import resolve, bucket_counts, TICK_FORMATS
+from utils.auth import current_user
+
+PAGE = "Overview"
 
 # 🔐 Authentication check
-if "user" not in st.session_state:
+if current_user() is None:
     st.warning("Please log in to access this page.")
     st.stop()
 
@@ -22,53 +27,45 @@ if logout:
 
 
 
-# 📊 Load data
-@st.cache_data
-def load_data():
-    data = list(listeria_collection.find({}, {"_id": 0}))
-    df = pd.DataFrame(data)
-    df["sample_date"] = pd.to_datetime(df["sample_date"], errors="coerce")
-    return df
-
 # 📈 Summary by code
-def test_summary_by_code(df):
+def test_summary_by_code(counts_df):
     st.subheader("🔬 Test Summary by Code")
 
-    if "code" not in df.columns or "value" not in df.columns:
-        st.warning("Missing 'code' or 'value' columns in data.")
+    if counts_df.empty:
+        st.warning("No 'code' / 'value' results in the selected range.")
         return
 
-    summary_df = (
-        df.groupby(["code", "value"])
-        .size()
-        .reset_index(name="count")
-        .pivot(index="code", columns="value", values="count")
-        .fillna(0)
-        .astype(int)
-    )
-
-    summary_df["Total"] = summary_df.sum(axis=1)
-    if "Not Detected" in summary_df.columns:
-        summary_df["Detection Rate (%)"] = (
-            100 * (summary_df["Total"] - summary_df["Not Detected"]) / summary_df["Total"]
-        ).round(2)
-    else:
-        summary_df["Detection Rate (%)"] = 100.0
+    summary_df = summary_by_code(counts_df)
 
     st.dataframe(summary_df.style.background_gradient(cmap="Oranges", axis=1))
 
 # 🔎 Main page content
 st.title("📊 Overview Dashboard")
-df = load_data()
+with span(PAGE, "query: date bounds"):
+    min_date, max_date = date_bounds()
+if min_date is None:
+    st.warning("No data available.")
+    st.stop()
 
 st.sidebar.header("Filters")
-date_range = st.sidebar.date_input("Date Range", [df["sample_date"].min(), df["sample_date"].max()])
-df = df[(df["sample_date"] >= pd.to_datetime(date_range[0])) & (df["sample_date"] <= pd.to_datetime(date_range[1]))]
+date_range = st.sidebar.date_input("Date Range", [min_date, max_date])
+if len(date_range) != 2:
+    st.info("Select an end date to finish the range.")
+    st.stop()
+resolution = resolve(
+    st.sidebar.selectbox("Resolution", ["Auto", "Day", "Week", "Month"]), date_range[0], date_range[1]
+)
+export_controls(date_range[0], date_range[1], PAGE)
+
+# Group by date and detection type (server-side aggregation)
+with span(PAGE, "query: counts by date") as stage:
+    datewise_df = stage.record(counts_by_date_outcome(date_range[0], date_range[1]))
+total, detected, rate = detection_rate(datewise_df)
 
 col1, col2, col3 = st.columns(3)
-col1.metric("Total Samples", len(df))
-col2.metric("Detected", df[df["value"] != "Not Detected"].shape[0])
-col3.metric("Detection Rate", f"{(df[df['value'] != 'Not Detected'].shape[0] / len(df)) * 100:.2f}%")
+col1.metric("Total Samples", total)
+col2.metric("Detected", detected)
+col3.metric("Detection Rate", f"{rate:.2f}%")
 
 # fig = px.bar(
 #     df.groupby("sample_date")["value"].apply(lambda x: (x != "Not Detected").sum()).reset_index(),
@@ -77,40 +74,32 @@ col3.metric("Detection Rate", f"{(df[df['value'] != 'Not Detected'].shape[0] / l
 # )
 # st.plotly_chart(fig, use_container_width=True)
 
-# 📈 Detection Breakdown by Sample Date
-detection_df = df.copy()
-detection_df["Detection"] = detection_df["value"].map(
-    lambda v: "Detected" if v != "Not Detected" else "Not Detected"
-)
-
-# Group by date and detection type
-datewise_df = (
-    detection_df.groupby([detection_df["sample_date"].dt.date, "Detection"])
-    .size()
-    .reset_index(name="count")
-)
-
+# 📈 Detection Breakdown by Sample Date (day / week / month buckets keep the bar count bounded)
 # Plot grouped bar chart
-fig = px.bar(
-    datewise_df,
-    x="sample_date",
-    y="count",
-    color="Detection",
-    title="Listeria Detection (Detected vs Not Detected) Over Time",
-    barmode="group",
-    color_discrete_map={
-        "Detected": "#BF00FF",       # Neon Green
-        "Not Detected": "#39FF14"    # Neon Purple
-    },
-    template="plotly_dark"
-)
-fig.update_layout(
-    xaxis_title="Sample Date",
-    yaxis_title="Number of Samples",
-    legend_title="Detection Result",
-)
-st.plotly_chart(fig, use_container_width=True)
+with span(PAGE, "figure"):
+    bucketed_df = bucket_counts(datewise_df, resolution)
+    fig = px.bar(
+        bucketed_df,
+        x="sample_date",
+        y="count",
+        color="Detection",
+        title="Listeria Detection (Detected vs Not Detected) Over Time",
+        barmode="group",
+        color_discrete_map={
+            "Detected": "#BF00FF",       # Neon Green
+            "Not Detected": "#39FF14"    # Neon Purple
+        },
+        template="plotly_dark"
+    )
+    fig.update_layout(
+        xaxis_title="Sample Date" if resolution == "Day" else f"Sample {resolution}",
+        xaxis_tickformat=TICK_FORMATS[resolution],
+        yaxis_title="Number of Samples",
+        legend_title="Detection Result",
+    )
+with span(PAGE, "render"):
+    st.plotly_chart(fig, use_container_width=True)
 
 
-# 🧪 Optional: Add test summary below the chart
-# test_summary_by_code(df)
+# 🧪 Optional: Add test summary below the chart (needs `counts_by_code_value` from utils.aggregations)
+# test_summary_by_code(counts_by_code_value(date_range[0], date_range[1]))
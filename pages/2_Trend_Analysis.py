@@ -3,10 +3,17 @@ st.set_page_config(page_title="Trend Analysis", layout="wide")  # MUST be first
 
 import pandas as pd
 import plotly.express as px
-from utils.db import listeria_collection
+from utils.aggregations import (
+    date_bounds, counts_by_date_outcome, rolling_detection, default_trend_start, DEFAULT_ROLLING_DAYS
+)
+from utils.timing import span
+from utils.timebuckets import resolve, bucket_counts, render_mode, TICK_FORMATS
+from utils.auth import current_user
+
+PAGE = "Trend Analysis"
 
 # 🔐 Authentication check
-if "user" not in st.session_state:
+if current_user() is None:
     st.warning("Please log in to access this page.")
     st.stop()
 
@@ -21,67 +28,98 @@ if st.sidebar.button("Logout"):
 # 📅 Page content
 st.title("📅 Trend Analysis")
 
-@st.cache_data
-def load_data():
-    df = pd.DataFrame(listeria_collection.find({}, {"_id": 0}))
-    df["sample_date"] = pd.to_datetime(df["sample_date"], errors="coerce")
-    return df
-
-df = load_data()
-
-# ✅ Ensure necessary columns exist
-if "sample_date" not in df.columns or "value" not in df.columns:
-    st.warning("The dataset is missing 'sample_date' or 'value' columns.")
+# 🗓️ Date range for X-axis (defaults to the latest 8 weeks; only this window is queried)
+with span(PAGE, "query: date bounds"):
+    min_date, max_date = date_bounds()
+if min_date is None:
+    st.warning("No data available.")
     st.stop()
 
-# 🧪 Label Detection
-df["Detection"] = df["value"].apply(lambda x: "Detected" if x != "Not Detected" else "Not Detected")
-
-# 🗓️ Restrict date range for X-axis
-start_date = pd.to_datetime("2025-02-03")
-end_date = pd.to_datetime("2025-03-28")
+st.sidebar.header("Filters")
+default_start = default_trend_start(min_date, max_date)
+date_range = st.sidebar.date_input(
+    "Date Range", [default_start, max_date], min_value=min_date, max_value=max_date
+)
+if len(date_range) != 2:
+    st.info("Select an end date to finish the range.")
+    st.stop()
+start_date, end_date = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
+window_days = st.sidebar.number_input("Rolling window (days)", min_value=2, max_value=90, value=DEFAULT_ROLLING_DAYS)
+resolution = resolve(st.sidebar.selectbox("Resolution", ["Auto", "Day", "Week", "Month"]), start_date, end_date)
 
-df = df[(df["sample_date"] >= start_date) & (df["sample_date"] <= end_date)]
+# 📊 Group by date and detection (server-side aggregation)
+with span(PAGE, "query: counts by date") as stage:
+    trend_df = stage.record(bucket_counts(counts_by_date_outcome(start_date, end_date), resolution))
 
-# 📊 Group by date and detection
-if df.empty:
+if trend_df.empty:
     st.warning("No data available in the selected date range.")
 else:
-    trend_df = df.groupby(["sample_date", "Detection"]).size().reset_index(name="count")
-
     # 💎 Plot line chart with value labels and diamond markers
-    fig = px.line(
-        trend_df,
-        x="sample_date",
-        y="count",
-        color="Detection",
-        title="Detection Trend Over Time",
-        template="plotly_dark",
-        color_discrete_map={
-            "Detected": "#8A00C4",       # Neon Purple
-            "Not Detected": "#39FF14"    # Neon Green
-        },
-        markers=True
-    )
-
-    # 🔧 Customize markers and annotations
-    fig.update_traces(marker=dict(symbol="diamond", size=10), text=trend_df["count"], textposition="top center")
-
-    # 🛠️ Customize x-axis to show all dates vertically
-    all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
-    fig.update_layout(
-        xaxis=dict(
-            tickmode='array',
-            tickvals=all_dates,
-            tickformat='%d-%b',
-            tickangle=90
-        ),
-        xaxis_title="Sample Date",
-        yaxis_title="Number of Samples",
-        legend_title="Detection Result"
-    )
-
-    st.plotly_chart(fig, use_container_width=True)
+    with span(PAGE, "figure"):
+        fig = px.line(
+            trend_df,
+            x="sample_date",
+            y="count",
+            color="Detection",
+            title="Detection Trend Over Time",
+            template="plotly_dark",
+            color_discrete_map={
+                "Detected": "#8A00C4",       # Neon Purple
+                "Not Detected": "#39FF14"    # Neon Green
+            },
+            markers=True,
+            render_mode=render_mode(len(trend_df))
+        )
+
+        # 🔧 Customize markers and annotations
+        fig.update_traces(marker=dict(symbol="diamond", size=10), text=trend_df["count"], textposition="top center")
+
+        # 🛠️ Customize x-axis to show every bucket vertically (at most MAX_BUCKETS ticks)
+        all_dates = sorted(trend_df["sample_date"].unique())
+        fig.update_layout(
+            xaxis=dict(
+                tickmode='array',
+                tickvals=all_dates,
+                tickformat=TICK_FORMATS[resolution],
+                tickangle=90
+            ),
+            xaxis_title="Sample Date" if resolution == "Day" else f"Sample {resolution}",
+            yaxis_title="Number of Samples",
+            legend_title="Detection Result"
+        )
+
+    with span(PAGE, "render"):
+        st.plotly_chart(fig, use_container_width=True)
+
+    # 📉 Rolling detection rate (window sums computed by the aggregation layer)
+    st.subheader(f"📉 {window_days}-Day Rolling Detection Rate")
+    with span(PAGE, "query: rolling detection") as stage:
+        rolling_df = stage.record(rolling_detection(start_date, end_date, int(window_days)))
+
+    with span(PAGE, "figure: rolling"):
+        fig_rolling = px.line(
+            rolling_df,
+            x="sample_date",
+            y=["rolling_detection_rate", "rolling_detected_avg"],
+            template="plotly_dark",
+            color_discrete_map={
+                "rolling_detection_rate": "#FF3131",   # Neon Red
+                "rolling_detected_avg": "#8A00C4"      # Neon Purple
+            },
+            render_mode=render_mode(len(rolling_df))
+        )
+        fig_rolling.for_each_trace(lambda trace: trace.update(name={
+            "rolling_detection_rate": "Detection rate (%)",
+            "rolling_detected_avg": "Detected per day (avg)",
+        }[trace.name]))
+        fig_rolling.update_layout(
+            xaxis_title="Sample Date",
+            yaxis_title=f"{window_days}-day rolling value",
+            legend_title="Metric"
+        )
+
+    with span(PAGE, "render: rolling"):
+        st.plotly_chart(fig_rolling, use_container_width=True)
 
 
 
@@ -1,12 +1,15 @@
 import streamlit as st
 st.set_page_config(page_title="Test Summary", layout="wide")  # ✅ Must be first Streamlit call
 
-import pandas as pd
 import plotly.express as px
-from utils.db import listeria_collection
+from utils.aggregations import detections_by_test
+from utils.timing import span
+from utils.auth import current_user
+
+PAGE = "Test Summary"
 
 # 🔐 Authentication check
-if "user" not in st.session_state:
+if current_user() is None:
     st.warning("🔒 Please log in to access this page.")
     st.stop()
 
@@ -20,18 +23,14 @@ if st.sidebar.button("Logout"):
 # 📊 Page title
 st.title("🧪 Test Summary")
 
-@st.cache_data
-def load_data():
-    df = pd.DataFrame(listeria_collection.find({}, {"_id": 0}))
-    return df
-
-df = load_data()
-
-# 🧮 Detection Summary
-summary = df.groupby("test")["value"].apply(lambda x: (x != "Not Detected").sum()).reset_index(name="Detections")
+# 🧮 Detection Summary (server-side aggregation)
+with span(PAGE, "query: detections by test") as stage:
+    summary = stage.record(detections_by_test())
 
-fig = px.bar(summary, x="test", y="Detections", color="Detections",
-             title="Detection Count by Test Type",
-             template="plotly_dark", color_continuous_scale="reds")
+with span(PAGE, "figure"):
+    fig = px.bar(summary, x="test", y="Detections", color="Detections",
+                 title="Detection Count by Test Type",
+                 template="plotly_dark", color_continuous_scale="reds")
 
-st.plotly_chart(fig, use_container_width=True)
+with span(PAGE, "render"):
+    st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,56 @@
+import streamlit as st
+st.set_page_config(page_title="Zone Risk", layout="wide")  # ✅ Must be first Streamlit call
+
+from utils.location_stats import LEVELS, WINDOWS, location_stats
+from utils.timing import span
+from utils.auth import current_user
+
+PAGE = "Zone Risk"
+LEVEL_LABELS = {"code": "Location code", "points": "Sampling point", "sub_area": "Sub-area"}
+
+# 🔐 Authentication check
+if current_user() is None:
+    st.warning("🔒 Please log in to access this page.")
+    st.stop()
+
+# 👤 Show current user and logout option
+st.sidebar.markdown(f"👤 Logged in as: `{st.session_state.user['username']}`")
+if st.sidebar.button("Logout"):
+    st.session_state.clear()
+    st.success("✅ Logged out successfully.")
+    st.stop()
+
+# 🚨 Page title
+st.title("🚨 Zone Risk")
+
+st.sidebar.header("Filters")
+level = st.sidebar.selectbox("Group by", LEVELS, index=LEVELS.index("points"), format_func=LEVEL_LABELS.get)
+min_samples = st.sidebar.number_input(f"Min. samples in last {WINDOWS[-1]} days", min_value=0, value=1)
+
+# 🧮 Per-location statistics (kept current incrementally, see utils/location_stats.py)
+with span(PAGE, "query: location stats") as stage:
+    stats = stage.record(location_stats(level))
+if stats.empty:
+    st.warning("No classified results available for this grouping.")
+    st.stop()
+
+visible = stats[stats[f"samples_{WINDOWS[-1]}d"] >= min_samples]
+
+col1, col2, col3 = st.columns(3)
+col1.metric("Locations", len(visible))
+col2.metric("On a positive streak", int((visible["streak"] > 0).sum()))
+col3.metric(f"Positive in last {WINDOWS[0]} days", int((visible["days_since_positive"] < WINDOWS[0]).sum()))
+
+# 📋 Risk table: highest recent detection rate first, then longest running streak
+with span(PAGE, "render"):
+    columns = (
+        [f"rate_{window}d" for window in WINDOWS] + [f"samples_{window}d" for window in WINDOWS]
+        + ["streak", "longest_streak", "days_since_positive", "last_positive", "last_sample",
+           "positives", "samples", "detection_rate"]
+    )
+    st.dataframe(
+        visible[columns].style.background_gradient(
+            cmap="Oranges", subset=[f"rate_{window}d" for window in WINDOWS] + ["streak"]
+        ).format(precision=1),
+        use_container_width=True,
+    )
@@ -2,10 +2,17 @@
 import streamlit as st
 import pandas as pd
 from utils.db import listeria_collection
+from utils.data import results
+from utils.cache import invalidate
+from utils.ingest import DEFAULT_BATCH_SIZE, ingest_csv, missing_columns
+from utils.timing import span
+from utils.auth import current_user
+
+PAGE = "Admin Upload"
 
 
 # 🔐 Check if user is logged in
-if "user" not in st.session_state:
+if current_user() is None:
     st.warning("Please log in to access this page.")
     st.stop()
 
@@ -30,36 +37,57 @@ if uploaded_file is None:
     st.stop()
 
 try:
-    df = pd.read_csv(uploaded_file, encoding="utf-8", encoding_errors="replace")
+    preview = pd.read_csv(uploaded_file, encoding="utf-8", encoding_errors="replace", nrows=5)
+    uploaded_file.seek(0)
 except Exception as e:
     st.error(f"Error reading CSV file: {e}")
     st.stop()
 
-st.write(df.head())  # Preview data
+st.write(preview)  # Preview data
 
 # ✅ Required columns
-required_columns = {
-    "sample_code", "sample_description", "translated_description", "test_code", "test_result","unit"
-    "analytical_report_code", "sample_date", "location_code", "fresh_smoked", "sub_area",
-     "before_during", "value", "week_num", "week", "x", "y","points"
-}
-if not required_columns.issubset(df.columns):
-    st.error(f"Missing required columns: {', '.join(required_columns - set(df.columns))}")
+missing = missing_columns(preview.columns)
+if missing:
+    st.error(f"Missing required columns: {', '.join(sorted(missing))}")
     st.stop()
 
-# 🕓 Date parsing
-df["sample_date"] = pd.to_datetime(df["sample_date"], format="%d-%m-%Y", errors="coerce")
-df["sample_date"] = df["sample_date"].where(df["sample_date"].notna(), None)
-
-# 🧑 Add uploader info
+# 🧑 Uploader info
 username = st.session_state.user.get("username", "admin")
-df["uploaded_by"] = username
 
-# 📤 Upload to MongoDB
+upsert = st.radio(
+    "Upload mode",
+    ["Update existing results (skip duplicates)", "Insert all rows"],
+    help="Rows are matched on sample code, test code and analytical report code.",
+) != "Insert all rows"
+batch_size = st.number_input("Rows per batch", min_value=100, max_value=50000, value=DEFAULT_BATCH_SIZE, step=100)
+
+# 📤 Upload to MongoDB (streamed in batches; each batch is validated and typed by the schema)
 if st.button("Upload to MongoDB"):
+    progress_bar = st.progress(0.0, text="Starting upload...")
+
+    def show_progress(batch_no, inserted, rejected):
+        done = min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0)
+        progress_bar.progress(done, text=f"Batch {batch_no}: {inserted} inserted, {rejected} rejected")
+
     try:
-        data_list = df.to_dict(orient="records")
-        result = listeria_collection.insert_many(data_list)
-        st.success(f"✅ Inserted {len(result.inserted_ids)} records into the database!")
+        with span(PAGE, "ingest") as stage:
+            report = ingest_csv(uploaded_file, listeria_collection, username, int(batch_size), show_progress, upsert=upsert)
+            stage.rows, stage.bytes = report["inserted"] + report["updated"], uploaded_file.size
     except Exception as e:
         st.error(f"❌ Database Error: {e}")
+        st.stop()
+
+    progress_bar.progress(1.0, text=f"Done in {report['batches']} batches")
+    if upsert:
+        st.success(
+            f"✅ {report['inserted']} new, {report['updated']} updated, "
+            f"{report['unchanged']} unchanged records."
+        )
+    else:
+        st.success(f"✅ Inserted {report['inserted']} records into the database!")
+    if not report["rejects"].empty:
+        st.warning(f"⚠️ {len(report['rejects'])} rows were rejected (CSV line and reasons below).")
+        st.dataframe(report["rejects"])
+    # make the new rows visible to the dashboards right away
+    results.refresh()
+    invalidate()
@@ -1,124 +1,220 @@
-import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import cv2
-import numpy as np
-import os
-from pymongo import MongoClient
-from datetime import datetime, timedelta
-import plotly.express as px
-import plotly.graph_objects as go
-from PIL import Image
-import base64
-from io import BytesIO
-
-# MongoDB connection
-client = MongoClient(st.secrets["MONGO_URI"])
-db = client["koral"]
-listeria_collection = db["listeria"]
-
-def load_image_base64(image_path="koral6.png"):
-    if not os.path.exists(image_path):
-        st.error(f"Image not found at {image_path}")
-        return None, None, (0, 0)
-    image = Image.open(image_path)
-    buffered = BytesIO()
-    image.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return image, f"data:image/png;base64,{img_str}", image.size  # (width, height)
-
-# ---- Streamlit App ----
-st.title("Listeria Sample Map Visualization")
-
-# Load image for background
-image_pil, image_base64, (width, height) = load_image_base64()
-
-# Get unique dates from database
-all_data = list(listeria_collection.find({"x": {"$exists": True}, "y": {"$exists": True}}))
-if not all_data:
-    st.warning("No data found with X and Y coordinates in MongoDB.")
-else:
-    df = pd.DataFrame(all_data)
-    df['sample_date'] = pd.to_datetime(df['sample_date']).dt.date
-
-    available_dates = df['sample_date'].dropna().unique()
-    selected_date = st.selectbox("Select a Date", sorted(available_dates, reverse=True))
-
-    if selected_date:
-        filtered = df[df['sample_date'] == selected_date].copy()
-        filtered = filtered.rename(columns={"point": "points"})
-
-        if not filtered.empty:
-            # Normalize columns
-            filtered['points'] = filtered['points'].astype(str)
-            filtered['x'] = pd.to_numeric(filtered['x'], errors='coerce')
-            filtered['y'] = pd.to_numeric(filtered['y'], errors='coerce')
-            filtered['values'] = pd.to_numeric(filtered['values'], errors='coerce')
-
-            if 'description' not in filtered.columns:
-                filtered['description'] = ""
-
-            # Create lookup for last 15 days' values per point
-            start_date = selected_date - timedelta(days=14)
-            recent_data = df[(df['sample_date'] >= start_date) & (df['sample_date'] <= selected_date)].copy()
-            recent_data = recent_data.rename(columns={"point": "points"})
-            recent_data['points'] = recent_data['points'].astype(str)
-            recent_data['values'] = pd.to_numeric(recent_data['values'], errors='coerce')
-
-            recent_lookup = recent_data.groupby('points').apply(
-                lambda x: "<br>&nbsp;&nbsp;".join(x.sort_values('sample_date').apply(
-                    lambda row: f"{row['sample_date']}: {'<b style=\"color:red\">Positive</b>' if row['values'] == 1 else '<b style=\"color:green\">Negative</b>' if row['values'] == 0 else 'Unknown'}",
-                    axis=1))
-            )
-
-            filtered['history'] = filtered['points'].map(recent_lookup).fillna("No history available")
-
-            filtered['hover_text'] = (
-                "<b>Point:</b> " + filtered['points'] + "<br>"
-                + "<b>Description:</b> " + filtered['description'].astype(str) + "<br>"
-                + "<b>Status:</b> " + filtered['values'].map({1: "Positive", 0: "Negative"}).fillna("Unknown") + "<br>"
-                + "<b>X:</b> " + filtered['x'].astype(str) + "<br>"
-                + "<b>Y:</b> " + filtered['y'].astype(str) + "<br>"
-                + "<b>Last 15 Days:</b><br>&nbsp;&nbsp;" + filtered['history']
-            )
-
-            # Create figure with background image
-            fig = go.Figure()
-            fig.add_layout_image(
-                dict(
-                    source=image_base64,
-                    xref="x",
-                    yref="y",
-                    x=0,
-                    y=height,
-                    sizex=width,
-                    sizey=height,
-                    sizing="stretch",
-                    layer="below"
-                )
-            )
-
-            fig.add_trace(go.Scatter(
-                x=filtered['x'],
-                y=height - filtered['y'],
-                mode='markers',
-                marker=dict(
-                    size=12,
-                    color=filtered['values'].map({1: "#FF0000", 0: "#008000"}).fillna("#FFBF00"),
-                    line=dict(width=1, color='DarkSlateGrey')
-                ),
-                customdata=filtered[['hover_text']],
-                hovertemplate="%{customdata[0]}<extra></extra>"
-            ))
-
-            fig.update_layout(
-                xaxis=dict(visible=False, range=[0, width]),
-                yaxis=dict(visible=False, range=[0, height]),
-                showlegend=False,
-                margin=dict(l=0, r=0, t=40, b=0),
-                title=f"Listeria Points on {selected_date}"
-            )
-
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.warning("No data found for the selected date.")
+import streamlit as st
+import numpy as np
+from datetime import timedelta
+import plotly.graph_objects as go
+from utils.data import map_dates, load_map_window
+from utils.heatmap import METRICS, get_heatmap_grid, surface
+from utils.map_history import HISTORY_DAYS, get_point_history
+from utils.spatial import CLUSTER_MIN_POINTS, cluster_size, get_day_index
+from utils.floorplan import IMAGE_PATH, load_background
+from utils.timing import span
+
+PAGE = "Map"
+OUTCOME_TEXT = {1: "Positive", 0: "Negative"}
+
+# ---- Streamlit App ----
+st.title("Listeria Sample Map Visualization")
+
+# Load image for background (encoded once per process, see utils/floorplan.py)
+with span(PAGE, "background"):
+    image_source, (width, height) = load_background()
+if image_source is None:
+    st.error(f"Image not found at {IMAGE_PATH}")
+    st.stop()  # the viewport and marker positions are in floor plan pixels
+
+# Get unique dates from the database (distinct days only, not the documents)
+with span(PAGE, "query: dates") as stage:
+    available_dates = stage.record(map_dates())
+if not available_dates:
+    st.warning("No data found with X and Y coordinates in MongoDB.")
+else:
+    mode = st.sidebar.radio("Mode", ["Daily points", "Heatmap"])
+
+    if mode == "Heatmap":
+        # 🔥 Where positives concentrate over a date range (per-day grids, see utils/heatmap.py)
+        first_date, last_date = available_dates[-1], available_dates[0]
+        heat_range = st.sidebar.date_input(
+            "Heatmap Range", [max(first_date, last_date - timedelta(days=90)), last_date],
+            min_value=first_date, max_value=last_date
+        )
+        metric = st.sidebar.selectbox("Metric", METRICS)
+        sigma = st.sidebar.slider("Smoothing (bins)", 0.0, 5.0, 1.0, 0.5)
+        if len(heat_range) != 2:
+            st.info("Select an end date to finish the range.")
+            st.stop()
+
+        # Only days of the range the shared grid hasn't binned yet are read
+        grid = get_heatmap_grid(width, height)
+        with span(PAGE, "query: heatmap days") as stage:
+            stage.record(grid.fill(heat_range[0], heat_range[1]))
+        with span(PAGE, "transform: heatmap"):
+            positives, negatives = grid.totals(heat_range[0], heat_range[1])
+            values = surface(positives, negatives, metric, sigma)
+            xs, ys = grid.centers()
+
+        with span(PAGE, "figure"):
+            fig = go.Figure()
+            fig.add_layout_image(
+                dict(
+                    source=image_source,
+                    xref="x",
+                    yref="y",
+                    x=0,
+                    y=height,
+                    sizex=width,
+                    sizey=height,
+                    sizing="stretch",
+                    layer="below"
+                )
+            )
+            fig.add_trace(go.Heatmap(
+                x=xs,
+                y=height - ys,
+                z=values,
+                colorscale="YlOrRd",
+                opacity=0.6,
+                zmin=0,
+                zmax=100 if metric == "Positive rate" else None,
+                colorbar=dict(title="%" if metric == "Positive rate" else metric),
+                hovertemplate=f"{metric}: %{{z:.1f}}<extra></extra>"
+            ))
+            fig.update_layout(
+                xaxis=dict(visible=False, range=[0, width]),
+                yaxis=dict(visible=False, range=[0, height]),
+                margin=dict(l=0, r=0, t=40, b=0),
+                title=(
+                    f"{metric} from {heat_range[0]} to {heat_range[1]} "
+                    f"({int(positives.sum())} positive of {int((positives + negatives).sum())} samples)"
+                )
+            )
+
+        with span(PAGE, "render"):
+            st.plotly_chart(fig, use_container_width=True)
+        st.stop()
+
+    selected_date = st.selectbox("Select a Date", available_dates)
+
+    if selected_date:
+        with span(PAGE, "query: window") as stage:
+            # Only the selected day plus its 15-day history window is fetched
+            window_df = stage.record(load_map_window(selected_date, HISTORY_DAYS))
+        with span(PAGE, "transform: index"):
+            # Day frame and its grid index are built once per window and date (utils/spatial.py)
+            day_df, index = get_day_index(window_df, selected_date)
+
+        if not day_df.empty:
+            # 🔍 Viewport (image pixels, y from the top as stored) and zoom-dependent clustering
+            st.sidebar.header("Viewport")
+            x0, x1 = st.sidebar.slider("X range", 0, width, (0, width))
+            y0, y1 = st.sidebar.slider("Y range", 0, height, (0, height))
+            cluster_choice = st.sidebar.selectbox("Clustering", ["Auto", "On", "Off"])
+
+            with span(PAGE, "transform: viewport") as stage:
+                visible = stage.record(index.viewport(x0, x1, y0, y1))
+                clustered = cluster_choice == "On" or (
+                    cluster_choice == "Auto" and len(visible) > CLUSTER_MIN_POINTS
+                )
+
+            with span(PAGE, "transform: history"):
+                if clustered:
+                    clusters = index.clusters(visible, cluster_size(x0, x1), day_df["outcome"].to_numpy())
+                    point_names = day_df["points"].astype(str).to_numpy()
+                    clusters["hover_text"] = (
+                        "<b>Samples:</b> " + clusters["count"].astype(str) + "<br>"
+                        + "<b>Positive:</b> " + clusters["positives"].astype(int).astype(str) + "<br>"
+                        + "<b>Points:</b> " + clusters["members"].map(
+                            lambda members: ", ".join(sorted(set(point_names[members[:10]])))
+                            + (" …" if len(members) > 10 else "")
+                        )
+                    )
+                else:
+                    # Hover text (and its 15-day history) only for the points in view
+                    filtered = day_df.iloc[visible].copy()
+                    recent_lookup = get_point_history(window_df, selected_date)
+
+                    filtered['points'] = filtered['points'].astype(str)
+                    filtered['history'] = filtered['points'].map(recent_lookup).fillna("No history available")
+
+                    filtered['hover_text'] = (
+                        "<b>Point:</b> " + filtered['points'] + "<br>"
+                        + "<b>Description:</b> " + filtered['description'].astype(str) + "<br>"
+                        + "<b>Status:</b> " + filtered['outcome'].map(OUTCOME_TEXT).fillna("Unknown") + "<br>"
+                        + "<b>X:</b> " + filtered['x'].astype(str) + "<br>"
+                        + "<b>Y:</b> " + filtered['y'].astype(str) + "<br>"
+                        + "<b>Last 15 Days:</b><br>&nbsp;&nbsp;" + filtered['history']
+                    )
+
+            # Create figure with background image
+            with span(PAGE, "figure"):
+                fig = go.Figure()
+                fig.add_layout_image(
+                    dict(
+                        source=image_source,
+                        xref="x",
+                        yref="y",
+                        x=0,
+                        y=height,
+                        sizex=width,
+                        sizey=height,
+                        sizing="stretch",
+                        layer="below"
+                    )
+                )
+
+                if clustered:
+                    fig.add_trace(go.Scattergl(
+                        x=clusters['x'],
+                        y=height - clusters['y'],
+                        mode='markers+text',
+                        text=clusters['count'].astype(str),
+                        textfont=dict(color="white", size=10),
+                        marker=dict(
+                            # Bubble area grows with the sample count; red if any member is positive
+                            size=np.clip(10 + 4 * np.sqrt(clusters['count']), 12, 40),
+                            color=np.where(clusters['positives'] > 0, "#FF0000", "#008000"),
+                            opacity=0.8,
+                            line=dict(width=1, color='DarkSlateGrey')
+                        ),
+                        customdata=clusters[['hover_text']],
+                        hovertemplate="%{customdata[0]}<extra></extra>"
+                    ))
+                else:
+                    fig.add_trace(go.Scattergl(
+                        x=filtered['x'],
+                        y=height - filtered['y'],
+                        mode='markers',
+                        marker=dict(
+                            size=12,
+                            color=filtered['outcome'].map({1: "#FF0000", 0: "#008000"}).fillna("#FFBF00"),
+                            line=dict(width=1, color='DarkSlateGrey')
+                        ),
+                        customdata=filtered[['hover_text']],
+                        hovertemplate="%{customdata[0]}<extra></extra>"
+                    ))
+
+                fig.update_layout(
+                    xaxis=dict(visible=False, range=[x0, x1]),
+                    yaxis=dict(visible=False, range=[height - y1, height - y0]),
+                    showlegend=False,
+                    margin=dict(l=0, r=0, t=40, b=0),
+                    title=f"Listeria Points on {selected_date} ({len(visible)} of {len(day_df)} in view)"
+                )
+
+            with span(PAGE, "render"):
+                st.plotly_chart(fig, use_container_width=True)
+
+            # 📌 Nearest sample to a floor plan position
+            with st.expander("Find nearest sample"):
+                col1, col2 = st.columns(2)
+                near_x = col1.number_input("X", min_value=0, max_value=width, value=width // 2)
+                near_y = col2.number_input("Y", min_value=0, max_value=height, value=height // 2)
+                position, distance = index.nearest(near_x, near_y)
+                if position is not None:
+                    nearest = day_df.iloc[position]
+                    st.write(
+                        f"**{nearest['points']}** ({nearest['description']}) at "
+                        f"({nearest['x']:.0f}, {nearest['y']:.0f}), {distance:.0f} px away: "
+                        f"{OUTCOME_TEXT.get(nearest['outcome'], 'Unknown')}"
+                    )
+        else:
+            st.warning("No data found for the selected date.")
@@ -0,0 +1,52 @@
+import streamlit as st
+st.set_page_config(page_title="Performance", layout="wide")  # ✅ Must be first Streamlit call
+
+from utils.db import pool_stats
+from utils import cache
+from utils.timing import summary, reset, WINDOW
+from utils.auth import current_user
+
+# 🔐 Check if user is logged in
+if current_user() is None:
+    st.warning("Please log in to access this page.")
+    st.stop()
+
+# 🛡️ Restrict to admins only
+if st.session_state.get("user", {}).get("role") != "admin":
+    st.error("You do not have permission to access this page.")
+    st.stop()
+
+# 👤 Display user info and logout option
+st.sidebar.markdown(f"👤 Logged in as: `{st.session_state.user['username']}`")
+if st.sidebar.button("Logout"):
+    st.session_state.clear()
+    st.success("🔓 Logged out successfully.")
+    st.stop()
+
+# ⏱️ Stage timings
+st.title("⏱️ Admin: Page Performance")
+st.caption(f"Latency per page and stage over the last {WINDOW} runs of this server process.")
+
+stages = summary()
+if stages.empty:
+    st.info("No timings recorded yet. Open a few dashboard pages first.")
+else:
+    page = st.selectbox("Page", ["All"] + sorted(stages["page"].unique()))
+    if page != "All":
+        stages = stages[stages["page"] == page]
+    st.dataframe(stages, use_container_width=True, hide_index=True)
+
+if st.button("Reset timings"):
+    reset()
+    st.rerun()
+
+# 🔌 MongoDB connection pool
+st.subheader("🔌 Connection Pool")
+st.json(pool_stats.snapshot())
+
+# 🗃️ Shared result cache
+st.subheader("🗃️ Result Cache")
+st.json(cache.stats())
+if st.button("Clear cache"):
+    cache.invalidate()
+    st.rerun()
@@ -0,0 +1,26 @@
+import pandas as pd
+from utils.data import DETECTED, NOT_DETECTED
+from utils.location_stats import LocationStats
+
+
+def _results(outcomes):
+    """Results frame with one sample per (day, point) -> outcome."""
+    return pd.DataFrame({
+        "points": [point for _, point in outcomes],
+        "sample_date": pd.to_datetime([day for day, _ in outcomes]),
+        "outcome": pd.Series(list(outcomes.values()), dtype="int8"),
+    })
+
+
+def test_positive_moved_between_locations_on_a_processed_day_rebuilds():
+    stats = LocationStats("points")
+    stats.update(_results({("2024-01-01", "A"): DETECTED, ("2024-01-01", "B"): NOT_DETECTED}))
+    assert stats.table().loc["A", "positives"] == 1
+
+    # A re-upload corrects the day: same totals, but B was the positive sample
+    stats.update(_results({("2024-01-01", "A"): NOT_DETECTED, ("2024-01-01", "B"): DETECTED}))
+    table = stats.table()
+    assert table.loc["A", "positives"] == 0
+    assert pd.isna(table.loc["A", "last_positive"])
+    assert table.loc["B", "positives"] == 1
+    assert table.loc["B", "last_positive"] == pd.Timestamp("2024-01-01")
@@ -0,0 +1,324 @@
+
+import logging
+import os
+
+import pandas as pd
+from pymongo.errors import OperationFailure
+from utils.db import RESULTS_COLLECTION, ROLLUP_COLLECTION, get_collection
+from utils.data import get_results, DETECTED_LABEL, NOT_DETECTED, NOT_DETECTED_LABEL
+from utils.cache import cached
+from utils import rollups
+
+# 🧮 Dashboard summaries computed by MongoDB `$group` pipelines, so pages receive a
+# few hundred aggregate rows instead of every swab result. The pandas engine runs
+# the same summaries over the shared frame and must return identical frames.
+
+logger = logging.getLogger(__name__)
+
+ENGINE = os.getenv("KORAL_AGGREGATION_ENGINE", "mongo")
+# Per-day series read the `daily_rollup` collection (see utils/rollups.py) instead of raw
+# results, once it has been rebuilt at least once (`python -m utils.rollups --rebuild`)
+USE_ROLLUP = os.getenv("KORAL_USE_ROLLUP", "1") == "1"
+
+# Trend Analysis defaults: the latest weeks of data and a 7-day rolling window
+DEFAULT_TREND_WEEKS = 8
+DEFAULT_ROLLING_DAYS = 7
+
+_DETECTION = {"$cond": [{"$eq": ["$value", NOT_DETECTED_LABEL]}, NOT_DETECTED_LABEL, DETECTED_LABEL]}
+
+
+def date_match(start=None, end=None, field="sample_date"):
+    dates = {"$type": "date"}
+    if start is not None:
+        dates["$gte"] = pd.to_datetime(start).to_pydatetime()
+    if end is not None:
+        dates["$lte"] = pd.to_datetime(end).to_pydatetime()
+    return {"$match": {field: dates}}
+
+
+def _date_frame(start=None, end=None):
+    df = get_results()
+    if df.empty:
+        return df
+    mask = df["sample_date"].notna()
+    if start is not None:
+        mask &= df["sample_date"] >= pd.to_datetime(start)
+    if end is not None:
+        mask &= df["sample_date"] <= pd.to_datetime(end)
+    return df[mask]
+
+
+def _series_engine(engine):
+    # An incomplete rollup would undercount, so the raw pipeline answers until it is rebuilt
+    if engine:
+        return engine
+    if ENGINE == "mongo" and USE_ROLLUP and rollups.is_complete():
+        return "rollup"
+    return ENGINE
+
+
+def _aggregate(pipeline, columns, collection=RESULTS_COLLECTION):
+    rows = [{**doc.pop("_id"), **doc} for doc in get_collection(collection).aggregate(pipeline)]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def _finish(df, keys, count_col):
+    # Shared output shape for both engines: plain string keys, int64 counts, sorted by key
+    df = df.copy()
+    for key in keys:
+        if key != "sample_date":
+            df[key] = df[key].astype(str)
+    df[count_col] = df[count_col].astype("int64")
+    return df.sort_values(keys).reset_index(drop=True)
+
+
+# Server pipelines, as (collection name, pipeline); utils/indexes.py explains these same ones
+
+def date_bounds_pipeline():
+    return RESULTS_COLLECTION, [
+        date_match(),
+        {"$group": {"_id": None, "min": {"$min": "$sample_date"}, "max": {"$max": "$sample_date"}}},
+    ]
+
+
+def counts_by_code_value_pipeline(start=None, end=None):
+    return RESULTS_COLLECTION, [
+        date_match(start, end),
+        {"$match": {"code": {"$ne": None}, "value": {"$ne": None}}},
+        {"$group": {"_id": {"code": "$code", "value": "$value"}, "count": {"$sum": 1}}},
+    ]
+
+
+def counts_by_date_outcome_pipeline(start=None, end=None, engine="mongo"):
+    if engine == "rollup":
+        return ROLLUP_COLLECTION, [
+            date_match(start, end, "date"),
+            {"$group": {
+                "_id": {
+                    "sample_date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+                    "Detection": "$Detection",
+                },
+                "count": {"$sum": "$count"},
+            }},
+            {"$match": {"count": {"$gt": 0}}},
+        ]
+    return RESULTS_COLLECTION, [
+        date_match(start, end),
+        {"$group": {
+            "_id": {
+                "sample_date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$sample_date"}},
+                "Detection": _DETECTION,
+            },
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+def detections_by_test_pipeline(start=None, end=None):
+    # Without bounds every result counts, including rows whose sample_date never parsed
+    bounded = start is not None or end is not None
+    return RESULTS_COLLECTION, ([date_match(start, end)] if bounded else []) + [
+        {"$match": {"test": {"$ne": None}}},
+        {"$group": {
+            "_id": {"test": "$test"},
+            "Detections": {"$sum": {"$cond": [{"$eq": ["$value", NOT_DETECTED_LABEL]}, 0, 1]}},
+        }},
+    ]
+
+
+def _fetch_start(start, window):
+    # The `window - 1` days before `start` complete the first trailing windows
+    return None if start is None else pd.to_datetime(start) - pd.Timedelta(days=window - 1)
+
+
+def rolling_detection_pipeline(start=None, end=None, window=DEFAULT_ROLLING_DAYS, engine="mongo"):
+    fetch_start = _fetch_start(start, window)
+    if engine == "rollup":
+        collection, day, count = ROLLUP_COLLECTION, "$date", "$count"
+        detected = {"$cond": [{"$eq": ["$Detection", DETECTED_LABEL]}, "$count", 0]}
+        match = date_match(fetch_start, end, "date")
+    else:
+        collection, day, count = RESULTS_COLLECTION, {"$dateFromString": {
+            "dateString": {"$dateToString": {"format": "%Y-%m-%d", "date": "$sample_date"}},
+        }}, 1
+        detected = {"$cond": [{"$eq": ["$value", NOT_DETECTED_LABEL]}, 0, 1]}
+        match = date_match(fetch_start, end)
+    trailing = {"range": [-(window - 1), 0], "unit": "day"}
+    return collection, [
+        match,
+        {"$group": {"_id": day, "detected": {"$sum": detected}, "total": {"$sum": count}}},
+        {"$match": {"total": {"$gt": 0}}},
+        # Trailing sums run on the server (MongoDB 5.0+ window functions)
+        {"$setWindowFields": {"sortBy": {"_id": 1}, "output": {
+            "window_detected": {"$sum": "$detected", "window": trailing},
+            "window_total": {"$sum": "$total", "window": trailing},
+        }}},
+        {"$project": {"_id": 0, "sample_date": "$_id", "detected": 1, "total": 1, "window_detected": 1, "window_total": 1}},
+    ]
+
+
+@cached("aggregations.date_bounds")
+def date_bounds(engine=None):
+    """Earliest and latest `sample_date`, or (None, None) when there is no data."""
+    if (engine or ENGINE) == "pandas":
+        df = _date_frame()
+        if df.empty:
+            return None, None
+        return df["sample_date"].min(), df["sample_date"].max()
+    collection, pipeline = date_bounds_pipeline()
+    bounds = next(iter(get_collection(collection).aggregate(pipeline)), None)
+    if bounds is None:
+        return None, None
+    return pd.Timestamp(bounds["min"]), pd.Timestamp(bounds["max"])
+
+
+@cached("aggregations.counts_by_code_value")
+def counts_by_code_value(start=None, end=None, engine=None):
+    """Number of samples per (`code`, raw `value`)."""
+    keys = ["code", "value"]
+    if (engine or ENGINE) == "pandas":
+        df = _date_frame(start, end)
+        if df.empty:
+            return pd.DataFrame(columns=keys + ["count"])
+        counts = df.dropna(subset=keys).groupby(keys, observed=True).size().reset_index(name="count")
+        return _finish(counts, keys, "count")
+    collection, pipeline = counts_by_code_value_pipeline(start, end)
+    return _finish(_aggregate(pipeline, keys + ["count"], collection), keys, "count")
+
+
+@cached("aggregations.counts_by_date_outcome")
+def counts_by_date_outcome(start=None, end=None, engine=None):
+    """Number of samples per sample day and Detected / Not Detected outcome."""
+    keys = ["sample_date", "Detection"]
+    engine = _series_engine(engine)
+    if engine == "pandas":
+        df = _date_frame(start, end)
+        if df.empty:
+            return pd.DataFrame(columns=keys + ["count"])
+        # Group on the int8 outcome codes; labels are attached to the (small) result only
+        detected = df["outcome"].ne(NOT_DETECTED).rename("Detection")
+        counts = (
+            df.groupby([df["sample_date"].dt.normalize(), detected])
+            .size()
+            .reset_index(name="count")
+        )
+        counts["Detection"] = counts["Detection"].map({True: DETECTED_LABEL, False: NOT_DETECTED_LABEL})
+        return _finish(counts, keys, "count")
+    collection, pipeline = counts_by_date_outcome_pipeline(start, end, engine)
+    counts = _aggregate(pipeline, keys + ["count"], collection)
+    counts["sample_date"] = pd.to_datetime(counts["sample_date"])
+    return _finish(counts, keys, "count")
+
+
+@cached("aggregations.detections_by_test")
+def detections_by_test(start=None, end=None, engine=None):
+    """Number of non-negative results per `test`."""
+    keys = ["test"]
+    if (engine or ENGINE) == "pandas":
+        # Without bounds every result counts, including rows whose sample_date never parsed
+        bounded = start is not None or end is not None
+        df = _date_frame(start, end) if bounded else get_results()
+        if df.empty:
+            return pd.DataFrame(columns=keys + ["Detections"])
+        df = df.dropna(subset=keys)
+        detected = df["outcome"].ne(NOT_DETECTED).groupby(df["test"], observed=True).sum()
+        return _finish(detected.reset_index(name="Detections"), keys, "Detections")
+    collection, pipeline = detections_by_test_pipeline(start, end)
+    return _finish(_aggregate(pipeline, keys + ["Detections"], collection), keys, "Detections")
+
+
+@cached("aggregations.rolling_detection")
+def rolling_detection(start=None, end=None, window=DEFAULT_ROLLING_DAYS, engine=None):
+    """Per-day detected / total counts with trailing `window`-day sums, average and rate.
+
+    The window covers calendar days (days without samples count as zero), and the
+    `window - 1` days before `start` are read so the first rows are complete. Servers
+    without window functions (MongoDB < 5.0, mongomock) fall back to the pandas engine.
+    """
+    columns = ["sample_date", "detected", "total", "window_detected", "window_total"]
+    engine = _series_engine(engine)
+    if engine != "pandas":
+        collection, pipeline = rolling_detection_pipeline(start, end, window, engine)
+        try:
+            daily = pd.DataFrame(list(get_collection(collection).aggregate(pipeline)), columns=columns)
+            daily["sample_date"] = pd.to_datetime(daily["sample_date"])
+        except (OperationFailure, NotImplementedError) as e:
+            logger.warning("Rolling detection falls back to pandas, the server can't run it: %s", e)
+            engine = "pandas"
+    if engine == "pandas":
+        counts = counts_by_date_outcome.__wrapped__(_fetch_start(start, window), end, engine="pandas")
+        if counts.empty:
+            return pd.DataFrame(columns=columns + ["rolling_detected_avg", "rolling_detection_rate"])
+        daily = (
+            counts.pivot_table(index="sample_date", columns="Detection", values="count", aggfunc="sum", fill_value=0)
+            .reindex(columns=[DETECTED_LABEL, NOT_DETECTED_LABEL], fill_value=0)
+        )
+        daily = pd.DataFrame({"detected": daily[DETECTED_LABEL], "total": daily.sum(axis=1)})
+        rolled = daily.rolling(f"{window}D").sum()
+        daily["window_detected"], daily["window_total"] = rolled["detected"], rolled["total"]
+        daily = daily.reset_index()
+    if start is not None:
+        daily = daily[daily["sample_date"] >= pd.to_datetime(start)]
+    daily = daily[columns].astype({col: "int64" for col in columns[1:]})
+    daily["rolling_detected_avg"] = daily["window_detected"] / window
+    daily["rolling_detection_rate"] = 100 * daily["window_detected"] / daily["window_total"]
+    return daily.sort_values("sample_date").reset_index(drop=True)
+
+
+def default_trend_start(min_date, max_date):
+    return max(min_date, max_date - pd.Timedelta(weeks=DEFAULT_TREND_WEEKS))
+
+
+def summary_by_code(counts):
+    """Per-code table of `counts_by_code_value` results with totals and detection rate (%)."""
+    summary = (
+        counts
+        .pivot(index="code", columns="value", values="count")
+        .fillna(0)
+        .astype(int)
+    )
+    summary["Total"] = summary.sum(axis=1)
+    if NOT_DETECTED_LABEL in summary.columns:
+        summary["Detection Rate (%)"] = (
+            100 * (summary["Total"] - summary[NOT_DETECTED_LABEL]) / summary["Total"]
+        ).round(2)
+    else:
+        summary["Detection Rate (%)"] = 100.0
+    return summary
+
+
+def detection_rate(counts):
+    """(total, detected, rate %) from any of the count frames above."""
+    if "Detection" in counts.columns:
+        detected = counts.loc[counts["Detection"] == DETECTED_LABEL, "count"].sum()
+    else:
+        detected = counts.loc[counts["value"] != NOT_DETECTED_LABEL, "count"].sum()
+    total = counts["count"].sum()
+    return int(total), int(detected), (100 * detected / total if total else 0.0)
+
+
+def compare_engines(start=None, end=None):
+    """Run every summary on each server engine and on pandas; returns {name: identical?}."""
+    report = {}
+    checks = [
+        (counts_by_code_value, "mongo"),
+        (counts_by_date_outcome, "mongo"),
+        (counts_by_date_outcome, "rollup"),
+        (detections_by_test, "mongo"),
+        (rolling_detection, "mongo"),
+        (rolling_detection, "rollup"),
+    ]
+    for summary, engine in checks:
+        server = summary.__wrapped__(start, end, engine=engine)
+        frame = summary.__wrapped__(start, end, engine="pandas")
+        try:
+            pd.testing.assert_frame_equal(server, frame, check_dtype=False)
+            report[f"{summary.__name__} ({engine})"] = True
+        except AssertionError:
+            report[f"{summary.__name__} ({engine})"] = False
+    return report
+
+
+if __name__ == "__main__":
+    for name, identical in compare_engines().items():
+        print(f"{name}: {'ok' if identical else 'MISMATCH'}")
@@ -1,9 +1,104 @@
 
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
 import bcrypt
-from utils.db import users_collection
+import streamlit as st
+from utils.db import USERS_COLLECTION, get_collection
+
+# 🔐 Logins: bcrypt runs in a small bounded pool so a shift-change burst queues instead of
+# saturating every core (the pool bounds CPU only: each login's script thread still waits
+# for its check), sessions keep only a minimal principal (never the hash) with a TTL, and
+# repeated failures per username are throttled in memory before touching MongoDB.
+
+SESSION_TTL_SECONDS = int(os.getenv("KORAL_SESSION_TTL", str(8 * 3600)))
+BCRYPT_WORKERS = int(os.getenv("KORAL_BCRYPT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Longest a login waits in the bcrypt queue before the user is asked to retry
+BCRYPT_TIMEOUT_SECONDS = 10
+MAX_FAILURES = 5
+LOCKOUT_SECONDS = 30
+
+_bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_failures_lock = threading.Lock()
+_failures = {}  # username -> (consecutive failures, locked until)
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many failed attempts. Try again in {int(retry_after) + 1} seconds.")
+        self.retry_after = retry_after
+
+
+class LoginBusy(Exception):
+    def __init__(self):
+        super().__init__("The server is busy handling other logins. Please try again in a few seconds.")
+
+
+def _check_throttle(username):
+    with _failures_lock:
+        _, locked_until = _failures.get(username, (0, 0.0))
+    remaining = locked_until - time.monotonic()
+    if remaining > 0:
+        raise LoginThrottled(remaining)
+
+
+def _record_failure(username):
+    with _failures_lock:
+        failures, _ = _failures.get(username, (0, 0.0))
+        failures += 1
+        locked_until = 0.0
+        if failures >= MAX_FAILURES:
+            # Lockout doubles with every further failure, capped at 15 minutes
+            locked_until = time.monotonic() + min(LOCKOUT_SECONDS * 2 ** (failures - MAX_FAILURES), 900)
+        _failures[username] = (failures, locked_until)
+        if len(_failures) > 10000:
+            # Bound memory under username spraying: forget everyone not currently locked out
+            now = time.monotonic()
+            for name in [name for name, (_, until) in _failures.items() if until < now]:
+                del _failures[name]
+
+
+def _record_success(username):
+    with _failures_lock:
+        _failures.pop(username, None)
+
+
+def _principal(user):
+    return {"username": user["username"], "role": user.get("role"), "expires_at": time.time() + SESSION_TTL_SECONDS}
+
 
 def authenticate(username, password):
-    user = users_collection.find_one({"username": username})
-    if user and bcrypt.checkpw(password.encode(), user["password"].encode()):
-        return user
+    """Minimal principal for valid credentials, else None.
+
+    Raises LoginThrottled when the username is locked out, and LoginBusy when the check
+    waited BCRYPT_TIMEOUT_SECONDS in the queue (not counted as a failed attempt). The
+    calling thread blocks until the check finishes or times out.
+    """
+    _check_throttle(username)
+    user = get_collection(USERS_COLLECTION).find_one({"username": username}, {"username": 1, "role": 1, "password": 1})
+    if user:
+        check = _bcrypt_pool.submit(bcrypt.checkpw, password.encode(), user["password"].encode())
+        try:
+            valid = check.result(timeout=BCRYPT_TIMEOUT_SECONDS)
+        except FutureTimeout:
+            # Drop the queued check so it doesn't hold a pool slot for a user who has gone
+            check.cancel()
+            raise LoginBusy()
+        if valid:
+            _record_success(username)
+            return _principal(user)
+    _record_failure(username)
     return None
+
+
+def current_user():
+    """The logged-in principal for this session, or None (expired sessions are cleared)."""
+    user = st.session_state.get("user")
+    if user is None:
+        return None
+    if user.get("expires_at", 0) < time.time():
+        st.session_state.clear()
+        return None
+    return user
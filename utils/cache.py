@@ -0,0 +1,158 @@
+
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+
+# 🗃️ Process-wide cache for derived results (aggregates, filtered frames, figures) shared by
+# every session. Keys are the call arguments plus a data version that `invalidate()` bumps
+# (the upload path calls it), entries expire after a TTL, and the least recently used ones
+# are evicted once the memory budget is exceeded. Concurrent misses on the same key wait for
+# a single computation. Cached values are shared: never mutate them in place.
+
+TTL_SECONDS = int(os.getenv("KORAL_CACHE_TTL", "600"))
+BUDGET_BYTES = int(os.getenv("KORAL_CACHE_MB", "256")) * 1024 * 1024
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> (value, size, expires_at)
+_pending = {}  # key -> threading.Event for computations in flight
+_version = 0
+_used = 0
+_hits = _misses = _evictions = 0
+
+
+def size_of(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(size_of(item) for item in value)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 1024
+
+
+def data_version():
+    return _version
+
+
+def invalidate():
+    """Drop every cached result; call after writing to the results collections."""
+    global _version, _used
+    with _lock:
+        _version += 1
+        _entries.clear()
+        _used = 0
+
+
+def _store(key, value, ttl):
+    global _used, _evictions
+    size = size_of(value)
+    if size > BUDGET_BYTES:
+        return
+    with _lock:
+        if key[-1] != _version:
+            return  # invalidated while computing
+        if key in _entries:
+            _used -= _entries.pop(key)[1]
+        _entries[key] = (value, size, time.monotonic() + ttl)
+        _used += size
+        while _used > BUDGET_BYTES and _entries:
+            _, (_, evicted, _) = _entries.popitem(last=False)
+            _used -= evicted
+            _evictions += 1
+
+
+def _lookup(key):
+    global _used, _hits
+    entry = _entries.get(key)
+    if entry is None:
+        return False, None
+    value, size, expires_at = entry
+    if expires_at < time.monotonic():
+        del _entries[key]
+        _used -= size
+        return False, None
+    _entries.move_to_end(key)
+    _hits += 1
+    return True, value
+
+
+def cached(namespace, ttl=None):
+    """Decorator caching a function's result per arguments and data version.
+
+    The undecorated function stays available as `func.__wrapped__`.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            global _misses
+            while True:
+                with _lock:
+                    key = (namespace, args, tuple(sorted(kwargs.items())), _version)
+                    found, value = _lookup(key)
+                    if found:
+                        return value
+                    waiting = _pending.get(key)
+                    if waiting is None:
+                        waiting = _pending[key] = threading.Event()
+                        _misses += 1
+                        break
+                waiting.wait()
+            try:
+                value = func(*args, **kwargs)
+                _store(key, value, TTL_SECONDS if ttl is None else ttl)
+                return value
+            finally:
+                with _lock:
+                    _pending.pop(key, None)
+                waiting.set()
+        return wrapper
+    return decorator
+
+
+def stats():
+    with _lock:
+        return {
+            "entries": len(_entries),
+            "used_mb": round(_used / 1024 / 1024, 2),
+            "budget_mb": round(BUDGET_BYTES / 1024 / 1024, 2),
+            "hits": _hits,
+            "misses": _misses,
+            "evictions": _evictions,
+            "data_version": _version,
+        }
+
+
+class FrameDayCache:
+    """Small LRU of values derived from one day of a (cached, shared) window frame."""
+
+    def __init__(self, size=16):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (id(frame), day) -> (frame, value)
+
+    def get(self, frame, selected_date, build):
+        """`build(day)` for `selected_date` in `frame`, built once while the entry is kept."""
+        day = pd.Timestamp(selected_date).normalize()
+        key = (id(frame), day)
+        with self._lock:
+            entry = self._entries.get(key)
+            # Entries hold their frame, so its id can't be reused by another while cached
+            if entry is not None and entry[0] is frame:
+                self._entries.move_to_end(key)
+                return entry[1]
+        value = build(day)
+        with self._lock:
+            self._entries[key] = (frame, value)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
@@ -0,0 +1,303 @@
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from utils.db import DB_NAME, MAP_COLLECTION, RESULTS_COLLECTION, get_collection
+from utils.cache import cached, invalidate
+
+# 🧱 One typed, process-wide copy of the results shared by every page (the map collection
+# is only read a date window at a time, see `load_map_window`).
+# Frames returned here are shared across sessions: filter/copy, never mutate in place.
+# A refresh swaps in a new frame, so a page keeps a consistent snapshot for its whole run.
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_COLUMNS = ["code", "value", "test", "location_code", "points"]
+FLOAT_COLUMNS = ["x", "y"]
+
+# Result outcome encoded once per row (int8), so groupbys and filters run on integers.
+# The values line up with the map collection's numeric `values` field (1 positive, 0 negative).
+DETECTED, NOT_DETECTED, UNKNOWN = 1, 0, -1
+# Labels of the outcomes (the canonical `value` spellings, see utils/schema.py)
+DETECTED_LABEL, NOT_DETECTED_LABEL, UNKNOWN_LABEL = "Detected", "Not Detected", "Unknown"
+OUTCOME_LABELS = {DETECTED: DETECTED_LABEL, NOT_DETECTED: NOT_DETECTED_LABEL, UNKNOWN: UNKNOWN_LABEL}
+_OUTCOME_CODES = {label: code for code, label in OUTCOME_LABELS.items() if code != UNKNOWN}
+
+# How often a page visit may trigger an incremental poll when no change stream is running
+POLL_INTERVAL_SECONDS = int(os.getenv("KORAL_POLL_INTERVAL", "60"))
+# Replica sets / Atlas support change streams; standalone servers fall back to polling
+USE_CHANGE_STREAM = os.getenv("KORAL_CHANGE_STREAM", "0") == "1"
+# Local Parquet snapshots let a restarted process skip the full scan (empty value disables)
+SNAPSHOT_DIR = os.getenv("KORAL_SNAPSHOT_DIR", os.path.join(".cache", "snapshots"))
+
+try:
+    import pyarrow  # noqa: F401  (installed with streamlit)
+except ImportError:
+    SNAPSHOT_DIR = ""
+
+
+def encode_outcome(values):
+    """int8 outcome codes for raw result strings (anything unrecognised is UNKNOWN)."""
+    values = values.astype("category") if not isinstance(values.dtype, pd.CategoricalDtype) else values
+    # Encode each distinct category once, then gather by the integer category codes
+    lookup = np.array([_OUTCOME_CODES.get(c, UNKNOWN) for c in values.cat.categories] + [UNKNOWN], dtype="int8")
+    return pd.Series(lookup[values.cat.codes.to_numpy()], index=values.index, name="outcome")
+
+
+def decode_outcome(codes):
+    return pd.Series(pd.Categorical(codes).rename_categories(OUTCOME_LABELS), index=codes.index)
+
+
+def _normalize_results(df):
+    if "points" in df.columns:
+        df["points"] = df["points"].where(df["points"].isna(), df["points"].astype(str))
+    if "sample_date" in df.columns:
+        df["sample_date"] = pd.to_datetime(df["sample_date"], errors="coerce")
+    for col in FLOAT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    if "value" in df.columns:
+        df["outcome"] = encode_outcome(df["value"])
+    return df
+
+
+def _normalize_map_points(df):
+    # Older documents use `point` instead of `points`
+    if "point" in df.columns:
+        df["points"] = df["points"].fillna(df["point"]) if "points" in df.columns else df["point"]
+        df = df.drop(columns="point")
+    df["sample_date"] = pd.to_datetime(df["sample_date"], errors="coerce")
+    df["points"] = df["points"].astype(str).astype("category")
+    for col in FLOAT_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+    df["values"] = pd.to_numeric(df["values"], errors="coerce")
+    df["outcome"] = np.select([df["values"] == DETECTED, df["values"] == NOT_DETECTED], [DETECTED, NOT_DETECTED], UNKNOWN).astype("int8")
+    df["description"] = df["description"].fillna("") if "description" in df.columns else ""
+    return df
+
+
+def _append(frame, new):
+    # Align categories first so concat keeps the categorical dtypes
+    for col in frame.columns.intersection(new.columns):
+        if isinstance(frame[col].dtype, pd.CategoricalDtype) and isinstance(new[col].dtype, pd.CategoricalDtype):
+            categories = frame[col].cat.categories.union(new[col].cat.categories)
+            frame[col] = frame[col].cat.set_categories(categories)
+            new[col] = new[col].cat.set_categories(categories)
+    return pd.concat([frame, new], ignore_index=True)
+
+
+class Dataset:
+    """A cached collection query kept current through an `_id` / `uploaded_at` watermark."""
+
+    def __init__(self, name, collection_name, query, normalize):
+        self.name = name
+        self.collection_name = collection_name
+        self.query = query
+        self.normalize = normalize
+        self.frame = None
+        self.version = 0
+        self.last_id = None
+        self.last_uploaded_at = None
+        self.synced_at = 0.0
+        self.watching = False
+        self._lock = threading.RLock()
+
+    @property
+    def collection(self):
+        # Resolved on use, so loading a snapshot doesn't need a connection
+        return get_collection(self.collection_name)
+
+    def get(self):
+        with self._lock:
+            if self.frame is None:
+                if self._load_snapshot():
+                    # Reconcile only what changed since the snapshot was written; a row
+                    # count mismatch means deletions, which only a full scan can apply
+                    self.refresh()
+                    if len(self.frame) != self._count():
+                        self._replace(self._fetch(self.query))
+                        self._save_snapshot()
+                else:
+                    self._replace(self._fetch(self.query))
+                    self._save_snapshot()
+                if USE_CHANGE_STREAM and not self.watching:
+                    self.watch()
+            elif not self.watching and time.monotonic() - self.synced_at > POLL_INTERVAL_SECONDS:
+                self.refresh()
+            return self.frame
+
+    def refresh(self):
+        """Fetch documents inserted or re-uploaded since the last sync; returns the number applied."""
+        with self._lock:
+            if self.frame is None:
+                self.get()
+                return len(self.frame)
+            changed = []
+            if self.last_id is not None:
+                changed.append({"_id": {"$gt": self.last_id}})
+            if self.last_uploaded_at is not None:
+                changed.append({"uploaded_at": {"$gt": self.last_uploaded_at}})
+            if not changed:
+                self._replace(self._fetch(self.query))
+                self._save_snapshot()
+                return len(self.frame)
+            docs = self._fetch({"$and": [self.query, {"$or": changed}]})
+            self.synced_at = time.monotonic()
+            if docs.empty:
+                return 0
+            current = self.frame
+            if "_id" in current.columns:
+                current = current[~current["_id"].isin(docs["_id"])]
+            self._replace(_append(current.copy(), docs))
+            self._save_snapshot()
+            invalidate()  # derived results cached from the old rows are stale now
+            return len(docs)
+
+    def watch(self):
+        """Apply changes as they happen via a change stream; returns False if unsupported."""
+        try:
+            stream = self.collection.watch([{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}])
+        except (PyMongoError, NotImplementedError):
+            return False
+
+        def run():
+            try:
+                with stream:
+                    for _ in stream:
+                        self.refresh()
+            except PyMongoError:
+                pass
+            finally:
+                self.watching = False
+
+        self.watching = True
+        threading.Thread(target=run, name="koral-change-stream", daemon=True).start()
+        return True
+
+    def _fetch(self, query):
+        docs = list(self.collection.find(query))
+        for doc in docs:
+            if self.last_id is None or doc["_id"] > self.last_id:
+                self.last_id = doc["_id"]
+            uploaded_at = doc.get("uploaded_at")
+            if isinstance(uploaded_at, datetime) and (self.last_uploaded_at is None or uploaded_at > self.last_uploaded_at):
+                self.last_uploaded_at = uploaded_at
+        df = pd.DataFrame(docs)
+        if df.empty:
+            return df
+        df["_id"] = df["_id"].astype(str)
+        return self.normalize(df)
+
+    def _count(self):
+        if not self.query:
+            return self.collection.estimated_document_count()
+        return self.collection.count_documents(self.query)
+
+    def _snapshot_paths(self):
+        base = os.path.join(SNAPSHOT_DIR, f"{DB_NAME}-{self.collection_name}-{self.name}")
+        return base + ".parquet", base + ".json"
+
+    def _load_snapshot(self):
+        if not SNAPSHOT_DIR:
+            return False
+        data_path, meta_path = self._snapshot_paths()
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            frame = pd.read_parquet(data_path, memory_map=True)
+        except (OSError, ValueError):
+            return False
+        if "outcome" not in frame.columns:
+            frame = self.normalize(frame)  # snapshot written before the current schema
+        self.last_id = ObjectId(meta["last_id"]) if meta.get("last_id") else None
+        self.last_uploaded_at = datetime.fromisoformat(meta["last_uploaded_at"]) if meta.get("last_uploaded_at") else None
+        self._replace(frame)
+        return True
+
+    def _save_snapshot(self):
+        # Written to temporary files and swapped in, so a crash never leaves a torn snapshot
+        if not SNAPSHOT_DIR or self.frame is None or self.frame.empty:
+            return
+        data_path, meta_path = self._snapshot_paths()
+        meta = {
+            "last_id": str(self.last_id) if self.last_id is not None else None,
+            "last_uploaded_at": self.last_uploaded_at.isoformat() if self.last_uploaded_at else None,
+            "rows": len(self.frame),
+        }
+        try:
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            self.frame.to_parquet(data_path + ".tmp", index=False)
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(meta, f)
+            os.replace(data_path + ".tmp", data_path)
+            os.replace(meta_path + ".tmp", meta_path)
+        except (OSError, ValueError, TypeError, ImportError) as e:
+            # e.g. a column mixing numbers and text that Arrow cannot type; keep serving from memory
+            logger.warning("Snapshot of %s skipped: %s", self.name, e)
+
+    def _replace(self, frame):
+        self.frame = frame
+        self.version += 1
+        self.synced_at = time.monotonic()
+
+
+results = Dataset("results", RESULTS_COLLECTION, {}, _normalize_results)
+
+
+def get_results():
+    """Listeria results from the `fresh` collection."""
+    return results.get()
+
+
+GEOTAGGED = {"x": {"$exists": True}, "y": {"$exists": True}}
+MAP_FIELDS = ["points", "point", "x", "y", "values", "description", "sample_date"]
+
+
+def map_dates_pipeline():
+    return [
+        {"$match": {**GEOTAGGED, "sample_date": {"$type": "date"}}},
+        {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$sample_date"}}}},
+        {"$sort": {"_id": -1}},
+    ]
+
+
+def map_window_filter(end_date, days):
+    end = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+    start = end - pd.Timedelta(days=days)
+    return {**GEOTAGGED, "sample_date": {"$gte": start.to_pydatetime(), "$lt": end.to_pydatetime()}}
+
+
+@cached("data.map_dates")
+def map_dates():
+    """Distinct sample days that have geotagged samples, newest first (computed server-side)."""
+    return [pd.Timestamp(doc["_id"]).date() for doc in get_collection(MAP_COLLECTION).aggregate(map_dates_pipeline())]
+
+
+@cached("data.load_map_window")
+def load_map_window(end_date, days):
+    """Geotagged samples for the `days` ending on `end_date`, map fields only."""
+    projection = {"_id": 0, **{field: 1 for field in MAP_FIELDS}}
+    cursor = get_collection(MAP_COLLECTION).find(map_window_filter(end_date, days), projection)
+    df = pd.DataFrame(list(cursor), columns=MAP_FIELDS)
+    return _normalize_map_points(df)
+
+
+def filter_dates(df, start, end):
+    start, end = pd.to_datetime(start), pd.to_datetime(end)
+    return df[(df["sample_date"] >= start) & (df["sample_date"] <= end)]
+
+
+def detection_status(values):
+    """Label raw result values as Detected / Not Detected / Unknown."""
+    return decode_outcome(encode_outcome(values))
@@ -1,13 +1,141 @@
 
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 from dotenv import load_dotenv
+from functools import lru_cache
 import os
+import threading
+import time
 
 load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
+DB_NAME = os.getenv("KORAL_DB_NAME", "koral")
 
-client = MongoClient(MONGO_URI)
-db = client["koral"]
+# 🔌 One tuned client per process, created on first use and shared by every page.
+# Modules resolve collections with `get_collection(...)` inside functions, so importing
+# them never connects. zlib needs no extra package; "zstd" / "snappy" can be listed in
+# KORAL_MONGO_COMPRESSORS once zstandard / python-snappy are installed.
+CLIENT_OPTIONS = {
+    "appname": "koral-dashboard",
+    "maxPoolSize": int(os.getenv("KORAL_MONGO_MAX_POOL", "50")),
+    "minPoolSize": int(os.getenv("KORAL_MONGO_MIN_POOL", "0")),
+    "maxIdleTimeMS": int(os.getenv("KORAL_MONGO_MAX_IDLE_MS", "300000")),
+    "connectTimeoutMS": int(os.getenv("KORAL_MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    "serverSelectionTimeoutMS": int(os.getenv("KORAL_MONGO_SELECTION_TIMEOUT_MS", "5000")),
+    "socketTimeoutMS": int(os.getenv("KORAL_MONGO_SOCKET_TIMEOUT_MS", "30000")),
+    "compressors": os.getenv("KORAL_MONGO_COMPRESSORS", "zlib"),
+    "readPreference": os.getenv("KORAL_MONGO_READ_PREFERENCE", "primaryPreferred"),
+}
 
-users_collection = db["users"]
-listeria_collection = db["fresh"]
+RESULTS_COLLECTION = "fresh"
+MAP_COLLECTION = "listeria"
+ROLLUP_COLLECTION = "daily_rollup"
+USERS_COLLECTION = "users"
+
+COLLECTIONS = {
+    "users_collection": USERS_COLLECTION,
+    "listeria_collection": RESULTS_COLLECTION,
+    "map_collection": MAP_COLLECTION,
+    "rollup_collection": ROLLUP_COLLECTION,
+}
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters, for sizing `maxPoolSize` under concurrent sessions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = self.in_use = self.peak_in_use = 0
+        self.created = self.checkouts = self.checkout_failures = 0
+        self.checkout_wait_ms = 0.0
+        self._waits = {}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "open": self.open,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "created": self.created,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_checkout_wait_ms": self.checkout_wait_ms / self.checkouts if self.checkouts else 0.0,
+                "max_pool_size": CLIENT_OPTIONS["maxPoolSize"],
+            }
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._waits[threading.get_ident()] = time.monotonic()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self._waits.pop(threading.get_ident(), None)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            started = self._waits.pop(threading.get_ident(), None)
+            if started is not None:
+                self.checkout_wait_ms += (time.monotonic() - started) * 1000
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+pool_stats = PoolStats()
+
+
+@lru_cache(maxsize=None)
+def get_client():
+    if MONGO_URI and MONGO_URI.startswith("mongomock://"):
+        # In-memory server for benchmarks and local experiments (pip install mongomock)
+        import mongomock
+        return mongomock.MongoClient()
+    return MongoClient(MONGO_URI, event_listeners=[pool_stats], **CLIENT_OPTIONS)
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def get_collection(name):
+    return get_db()[name]
+
+
+def __getattr__(name):
+    # Keeps `from utils.db import db, listeria_collection, ...` working without
+    # building the client at import time of this module
+    if name == "client":
+        return get_client()
+    if name == "db":
+        return get_db()
+    if name in COLLECTIONS:
+        return get_collection(COLLECTIONS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
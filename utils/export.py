@@ -0,0 +1,126 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from utils.aggregations import counts_by_code_value, summary_by_code
+from utils.cache import cached
+from utils.data import get_results
+from utils.ingest import UPLOAD_FIELDS
+
+# 📤 Downloads of the filtered results and the per-code summary. Rows are read in slices
+# from the shared results frame (no filtered copy) and written chunk by chunk into a single
+# buffer; finished files go through the shared cache, so concurrent or repeated exports of
+# the same range and format are built once and never touch MongoDB.
+
+CHUNK_ROWS = int(os.getenv("KORAL_EXPORT_CHUNK_ROWS", "50000"))
+# Data rows per Excel sheet (the sheet limit is 1,048,576 rows including the header)
+EXCEL_MAX_ROWS = 1_048_575
+# Database and derived columns kept out of exports (`outcome` is the int8 code of `value`)
+INTERNAL_COLUMNS = sorted(UPLOAD_FIELDS) + ["outcome"]
+
+FORMATS = {"CSV": ("csv", "text/csv")}
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+    FORMATS["Parquet"] = ("parquet", "application/vnd.apache.parquet")
+except ImportError:
+    pq = None
+try:
+    import openpyxl  # noqa: F401  (pandas' Excel engine)
+    FORMATS["Excel"] = ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+except ImportError:
+    pass
+
+
+def result_chunks(start, end, chunk_rows=CHUNK_ROWS):
+    """Yield the results sampled from `start` to `end` in slices of `chunk_rows` rows."""
+    df = get_results()
+    columns = [i for i, column in enumerate(df.columns) if column not in INTERNAL_COLUMNS]
+    if df.empty:
+        yield df.iloc[:, columns]
+        return
+    dates = df["sample_date"]
+    mask = dates.notna() & (dates >= pd.to_datetime(start)) & (dates <= pd.to_datetime(end))
+    positions = np.flatnonzero(mask.to_numpy())
+    # Always yield once so an empty range still produces a file with a header
+    for i in range(0, max(len(positions), 1), chunk_rows):
+        yield df.iloc[positions[i:i + chunk_rows], columns]
+
+
+def _write_csv(chunks, buffer):
+    for i, chunk in enumerate(chunks):
+        buffer.write(chunk.to_csv(index=False, header=i == 0).encode("utf-8"))
+
+
+def _write_parquet(chunks, buffer):
+    writer = None
+    for chunk in chunks:
+        if writer is None:
+            table = pyarrow.Table.from_pandas(chunk, preserve_index=False)
+            writer = pq.ParquetWriter(buffer, table.schema)
+        else:
+            table = pyarrow.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+        writer.write_table(table)  # one row group per chunk
+    if writer is not None:
+        writer.close()
+
+
+def _write_excel(chunks, buffer, sheet="Data"):
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        part, rows = 1, 0
+        for chunk in chunks:
+            if rows and rows + len(chunk) > EXCEL_MAX_ROWS:
+                part, rows = part + 1, 0
+            chunk.to_excel(
+                writer,
+                sheet_name=sheet if part == 1 else f"{sheet} {part}",
+                startrow=rows + 1 if rows else 0,
+                header=not rows,
+                index=False,
+            )
+            rows += len(chunk)
+
+
+WRITERS = {"CSV": _write_csv, "Parquet": _write_parquet, "Excel": _write_excel}
+
+
+def _export(chunks, file_format):
+    # getvalue() hands over the buffer's own bytes (no second copy); closing drops the buffer
+    with io.BytesIO() as buffer:
+        WRITERS[file_format](chunks, buffer)
+        return buffer.getvalue()
+
+
+@cached("export.results")
+def export_results(start, end, file_format):
+    """File contents for the results sampled from `start` to `end`."""
+    return _export(result_chunks(start, end), file_format)
+
+
+@cached("export.summary")
+def export_summary(start, end, file_format):
+    """File contents for the per-code summary table of the range."""
+    summary = summary_by_code(counts_by_code_value(start, end))
+    return _export([summary.reset_index()], file_format)
+
+
+def export_controls(start, end, key):
+    """Sidebar controls to download the range's results or per-code summary."""
+    with st.sidebar.expander("📤 Export"):
+        table = st.radio("Data", ["Filtered results", "Summary by code"], key=f"{key}_export_table")
+        file_format = st.selectbox("Format", list(FORMATS), key=f"{key}_export_format")
+        # Files are only built once asked for; the checkbox keeps the button across reruns
+        if not st.checkbox("Prepare download", key=f"{key}_export_prepare"):
+            return
+        build = export_results if table == "Filtered results" else export_summary
+        extension, mime = FORMATS[file_format]
+        name = "results" if table == "Filtered results" else "summary_by_code"
+        st.download_button(
+            "Download",
+            data=build(start, end, file_format),
+            file_name=f"listeria_{name}_{start}_{end}.{extension}",
+            mime=mime,
+            key=f"{key}_export_download",
+        )
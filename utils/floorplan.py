@@ -0,0 +1,61 @@
+
+import base64
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image
+
+# 🗺️ Factory floor plan used as the map background. It is decoded and re-encoded once
+# per process (per file mtime) and, by default, written under Streamlit's static folder
+# so figures reference a URL instead of embedding the image on every rerun.
+
+IMAGE_PATH = "koral6.png"
+STATIC_DIR = os.path.join("static", "map")
+STATIC_URL = "app/static/map"
+
+# Target width for the encoded background (0 keeps the native resolution)
+MAX_WIDTH = int(os.getenv("KORAL_MAP_MAX_WIDTH", "0"))
+IMAGE_FORMAT = os.getenv("KORAL_MAP_FORMAT", "WEBP").upper()
+# Needs `enableStaticServing` (see .streamlit/config.toml); otherwise a data URI is used
+SERVE_STATIC = os.getenv("KORAL_MAP_STATIC", "1") == "1"
+
+
+def _encode(image, image_format):
+    buffered = BytesIO()
+    try:
+        image.save(buffered, format=image_format, quality=85)
+    except (KeyError, OSError):
+        # Pillow built without WebP support
+        buffered = BytesIO()
+        image_format = "PNG"
+        image.save(buffered, format=image_format, optimize=True)
+    return buffered.getvalue(), image_format.lower()
+
+
+@lru_cache(maxsize=4)
+def _render(image_path, mtime, max_width, image_format, serve_static):
+    image = Image.open(image_path)
+    size = image.size  # map x/y are in the original pixel space, whatever we ship
+    if max_width and image.width > max_width:
+        image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+    if image_format != "PNG" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    data, ext = _encode(image, image_format)
+
+    if serve_static:
+        name = f"{os.path.splitext(os.path.basename(image_path))[0]}-{int(mtime)}-{image.width}.{ext}"
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        path = os.path.join(STATIC_DIR, name)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(data)
+        return f"{STATIC_URL}/{name}", size
+    return f"data:image/{ext};base64,{base64.b64encode(data).decode()}", size
+
+
+def load_background(image_path=IMAGE_PATH):
+    """(image source for `add_layout_image`, (width, height)), or (None, (0, 0)) if missing."""
+    if not os.path.exists(image_path):
+        return None, (0, 0)
+    return _render(image_path, os.path.getmtime(image_path), MAX_WIDTH, IMAGE_FORMAT, SERVE_STATIC)
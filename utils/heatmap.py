@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+import pandas as pd
+from utils.cache import TTL_SECONDS, data_version
+from utils.data import load_map_window
+
+# 🔥 Contamination heatmap over the floor plan. Geotagged results are binned into one
+# positive and one negative 2D histogram per sample day, so a heatmap over any date range
+# is a sum of cached per-day grids. Only days of the range that aren't binned yet are read
+# from MongoDB (range queries on the map fields); binned days go stale like cached results,
+# after `invalidate()` or the cache TTL.
+
+# Bin edge in floor plan pixels
+BIN_SIZE = int(os.getenv("KORAL_HEATMAP_BIN", "10"))
+# Longest run of days read with one query when filling a range
+FETCH_DAYS = int(os.getenv("KORAL_HEATMAP_FETCH_DAYS", "31"))
+# Bins with fewer (smoothed) samples than this get no detection rate
+MIN_SAMPLES = 1
+METRICS = ["Positives", "Samples", "Positive rate"]
+
+
+def _runs(days, limit):
+    """(last day, length) of each run of consecutive `days`, runs capped at `limit` days."""
+    runs = []
+    for day in days:
+        if runs and day - runs[-1][0] == pd.Timedelta(days=1) and runs[-1][1] < limit:
+            runs[-1] = (day, runs[-1][1] + 1)
+        else:
+            runs.append((day, 1))
+    return runs
+
+
+class HeatmapGrid:
+    def __init__(self, width, height, bin_size=BIN_SIZE):
+        self.width, self.height, self.bin_size = width, height, bin_size
+        self.shape = (int(np.ceil(height / bin_size)), int(np.ceil(width / bin_size)))
+        self._days = {}  # day -> (positives grid, negatives grid); days without samples are absent
+        self._fetched = {}  # day -> time it was read, for every binned day (with samples or not)
+        self._version = data_version()
+        self._lock = threading.Lock()
+
+    def _bin(self, rows, outcome):
+        selected = rows[rows["outcome"] == outcome]
+        grid, _, _ = np.histogram2d(
+            selected["y"], selected["x"], bins=self.shape, range=[[0, self.height], [0, self.width]]
+        )
+        return grid.astype(np.float32)
+
+    def missing(self, start, end):
+        """Days from `start` to `end` that aren't binned yet or have gone stale."""
+        now = time.monotonic()
+        return [
+            day for day in pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize())
+            if now - self._fetched.get(day, -np.inf) > TTL_SECONDS
+        ]
+
+    def update(self, df, days):
+        """Replace the grids of `days` with the samples of `df` (which covers exactly those days)."""
+        frame = df.dropna(subset=["sample_date", "x", "y"])
+        binned = {
+            day: (self._bin(rows, 1), self._bin(rows, 0))
+            for day, rows in frame.groupby(frame["sample_date"].dt.normalize())
+        }
+        now = time.monotonic()
+        for day in days:
+            self._days.pop(day, None)
+            self._fetched[day] = now
+        self._days.update(binned)
+
+    def fill(self, start, end):
+        """Read and bin the days from `start` to `end` not binned yet; returns those days."""
+        with self._lock:
+            if self._version != data_version():
+                self._days, self._fetched, self._version = {}, {}, data_version()
+            missing = self.missing(start, end)
+            for last, length in _runs(missing, FETCH_DAYS):
+                # Uncached: the frame is only needed until its days are binned
+                df = load_map_window.__wrapped__(last, length)
+                self.update(df, pd.date_range(end=last, periods=length))
+            return missing
+
+    def totals(self, start, end):
+        """(positives, negatives) grids summed over the days from `start` to `end`."""
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        positives = np.zeros(self.shape, dtype=np.float32)
+        negatives = np.zeros(self.shape, dtype=np.float32)
+        with self._lock:
+            for day, (day_positives, day_negatives) in self._days.items():
+                if start <= day <= end:
+                    positives += day_positives
+                    negatives += day_negatives
+        return positives, negatives
+
+    def centers(self):
+        """Bin centre coordinates (x, y) in floor plan pixels, y measured from the top."""
+        xs = (np.arange(self.shape[1]) + 0.5) * self.bin_size
+        ys = (np.arange(self.shape[0]) + 0.5) * self.bin_size
+        return xs, ys
+
+
+def smooth(grid, sigma):
+    """Gaussian blur with a `sigma` in bins (0 leaves the grid untouched)."""
+    if not sigma:
+        return grid
+    return cv2.GaussianBlur(grid, (0, 0), sigmaX=sigma, sigmaY=sigma, borderType=cv2.BORDER_CONSTANT)
+
+
+def surface(positives, negatives, metric, sigma=0):
+    """Grid for one of METRICS, with empty bins as NaN so the floor plan shows through."""
+    positives, negatives = smooth(positives, sigma), smooth(negatives, sigma)
+    samples = positives + negatives
+    if metric == "Positives":
+        values = positives
+    elif metric == "Samples":
+        values = samples
+    else:
+        # A sampled bin without positives stays visible at 0 %
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(samples >= MIN_SAMPLES, positives / samples * 100, np.nan)
+    return np.where(values > 1e-6, values, np.nan)
+
+
+_lock = threading.Lock()
+_grids = {}
+
+
+def get_heatmap_grid(width, height):
+    """Shared grid for the floor plan size (call `fill` for the range before `totals`)."""
+    with _lock:
+        grid = _grids.get((width, height))
+        if grid is None:
+            grid = _grids[(width, height)] = HeatmapGrid(width, height)
+    return grid
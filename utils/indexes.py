@@ -0,0 +1,186 @@
+
+import logging
+import sys
+
+import pandas as pd
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+from utils.db import (
+    MAP_COLLECTION, RESULTS_COLLECTION, ROLLUP_COLLECTION, USERS_COLLECTION, get_collection, get_db
+)
+from utils import aggregations
+from utils.data import map_dates_pipeline, map_window_filter
+from utils.ingest import NATURAL_KEY, dedupe, duplicate_groups, normalize_keys
+from utils.map_history import HISTORY_DAYS
+from utils.rollups import KEY_FIELDS
+
+# 🗂️ Indexes backing every dashboard query, plus an explain() check that flags
+# queries the planner would still answer with a full collection scan.
+#   python -m utils.indexes            create missing indexes
+#   python -m utils.indexes --explain  create them, then report each query plan
+#   python -m utils.indexes --dedupe   first convert legacy numeric keys to text and delete
+#                                      all but the newest copy of each result
+# The unique natural key index can only be built once re-upload duplicates are gone; without
+# --dedupe nothing is deleted and the index is reported as failing with the duplicate groups.
+
+logger = logging.getLogger(__name__)
+
+INDEXES = [
+    (RESULTS_COLLECTION, [("sample_date", ASCENDING), ("code", ASCENDING)], {"name": "sample_date_code"}),
+    (RESULTS_COLLECTION, [("sample_date", ASCENDING), ("points", ASCENDING)], {"name": "sample_date_points"}),
+    # Partial: keys are stored as text; rows with a missing or null key can't be upserted
+    # and must not collide ($exists would still match explicit nulls)
+    (RESULTS_COLLECTION, [(field, ASCENDING) for field in NATURAL_KEY], {
+        "name": "natural_key_unique",
+        "unique": True,
+        "partialFilterExpression": {field: {"$type": "string"} for field in NATURAL_KEY},
+    }),
+    (MAP_COLLECTION, [("sample_date", ASCENDING), ("points", ASCENDING)], {
+        "name": "geotagged_sample_date_points",
+        "partialFilterExpression": {"x": {"$exists": True}, "y": {"$exists": True}},
+    }),
+    (ROLLUP_COLLECTION, [(field, ASCENDING) for field in KEY_FIELDS], {"name": "rollup_key_unique", "unique": True}),
+    (USERS_COLLECTION, [("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+]
+
+
+# Test Summary counts every result, dated or not: a full scan by design, reported but not failed
+FULL_SCAN_DETECTIONS = "detections by test (all dates)"
+EXPECTED_COLLSCANS = {FULL_SCAN_DETECTIONS}
+
+# IndexOptionsConflict, IndexKeySpecsConflict: an index of that name exists with other options
+INDEX_CONFLICT_CODES = {85, 86}
+
+
+def migrate_results():
+    """Normalize legacy natural keys and drop duplicate results; returns (normalized, removed)."""
+    normalized = normalize_keys(get_collection(RESULTS_COLLECTION))
+    removed = dedupe(get_collection(RESULTS_COLLECTION))
+    if normalized or removed:
+        logger.warning(
+            "%s: %d legacy keys converted to text, %d duplicate results removed",
+            RESULTS_COLLECTION, normalized, removed,
+        )
+    return normalized, removed
+
+
+def duplicates_report(limit=5):
+    """Summary of the results that share a natural key, or None if there are none."""
+    groups = duplicate_groups(get_collection(RESULTS_COLLECTION))
+    if not groups:
+        return None
+    extra = sum(group["count"] - 1 for group in groups)
+    examples = "; ".join(
+        f"{' / '.join(str(group['_id'][field]) for field in NATURAL_KEY)} ({group['count']} copies)"
+        for group in groups[:limit]
+    )
+    return (
+        f"{len(groups)} natural keys have duplicates ({extra} extra documents), e.g. {examples}. "
+        "Run `python -m utils.indexes --dedupe` to keep only the newest copy of each."
+    )
+
+
+def ensure_indexes():
+    """Create any missing index; returns a list of (collection, index name, error or None).
+
+    Nothing is deleted: if duplicates block the unique natural key index, its error lists
+    them (see `migrate_results` to remove them).
+    """
+    report = []
+    for collection, keys, options in INDEXES:
+        try:
+            try:
+                get_collection(collection).create_index(keys, **options)
+            except OperationFailure as e:
+                if e.code not in INDEX_CONFLICT_CODES:
+                    raise
+                # Built earlier with other options (e.g. the old partial filter): rebuild it
+                get_collection(collection).drop_index(options["name"])
+                get_collection(collection).create_index(keys, **options)
+            report.append((collection, options["name"], None))
+        except OperationFailure as e:
+            error = str(e)
+            if options["name"] == "natural_key_unique":
+                error = duplicates_report() or error
+            report.append((collection, options["name"], error))
+    return report
+
+
+def dashboard_queries():
+    """(label, collection name, find filter or aggregate pipeline) for each query the pages run.
+
+    Built by the same functions the pages' queries use, with each page's default arguments.
+    """
+    end = pd.Timestamp.today().normalize()
+    start = end - pd.Timedelta(days=90)
+    window = aggregations.DEFAULT_ROLLING_DAYS
+    return [
+        ("date bounds", *aggregations.date_bounds_pipeline()),
+        ("counts by code x value", *aggregations.counts_by_code_value_pipeline(start, end)),
+        ("counts by date x outcome (rollup)", *aggregations.counts_by_date_outcome_pipeline(start, end, "rollup")),
+        ("counts by date x outcome (raw)", *aggregations.counts_by_date_outcome_pipeline(start, end, "mongo")),
+        ("rolling detection (rollup)", *aggregations.rolling_detection_pipeline(start, end, window, "rollup")),
+        ("rolling detection (raw)", *aggregations.rolling_detection_pipeline(start, end, window, "mongo")),
+        (FULL_SCAN_DETECTIONS, *aggregations.detections_by_test_pipeline()),
+        ("map dates", MAP_COLLECTION, map_dates_pipeline()),
+        ("map window", MAP_COLLECTION, map_window_filter(end, HISTORY_DAYS)),
+        ("login", USERS_COLLECTION, {"username": ""}),
+    ]
+
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+def _winning_plans(explain):
+    # find and aggregate explain output nest the winning plan at different depths
+    if isinstance(explain, dict):
+        if "winningPlan" in explain:
+            yield explain["winningPlan"]
+            return
+        for value in explain.values():
+            yield from _winning_plans(value)
+    elif isinstance(explain, list):
+        for value in explain:
+            yield from _winning_plans(value)
+
+
+def explain_queries():
+    """Returns (label, plan stages, uses COLLSCAN?) for each dashboard query."""
+    report = []
+    for label, collection, query in dashboard_queries():
+        if isinstance(query, list):
+            command = {"aggregate": collection, "pipeline": query, "cursor": {}}
+        else:
+            command = {"find": collection, "filter": query}
+        try:
+            plan = get_db().command("explain", command, verbosity="queryPlanner")
+        except OperationFailure as e:
+            report.append((label, [f"explain failed: {e}"], False))
+            continue
+        stages = [stage for winning in _winning_plans(plan) for stage in _stages(winning)]
+        report.append((label, stages, "COLLSCAN" in stages))
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if "--dedupe" in sys.argv[1:]:
+        migrate_results()
+    for name, index, error in ensure_indexes():
+        print(f"{name}.{index}: {'ok' if error is None else error}")
+    if "--explain" in sys.argv[1:]:
+        collscans = 0
+        for label, stages, collscan in explain_queries():
+            expected = label in EXPECTED_COLLSCANS
+            collscans += collscan and not expected
+            status = ("COLLSCAN (by design)" if expected else "COLLSCAN") if collscan else "ok"
+            print(f"{status:8} {label}: {' <- '.join(stages)}")
+        sys.exit(1 if collscans else 0)
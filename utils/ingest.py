@@ -0,0 +1,214 @@
+
+import math
+from datetime import datetime
+
+import pandas as pd
+from pymongo import DeleteMany, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from utils import rollups
+from utils.schema import RESULTS_SCHEMA, to_documents, validate
+
+# 📤 Streaming CSV ingest: the file is read, validated against the schema (utils/schema.py)
+# and written chunk by chunk, so peak memory depends on the batch size, not on the size of
+# the upload.
+
+DEFAULT_BATCH_SIZE = 1000
+
+# One lab result per sample, test and report: re-uploading a report updates these rows in place
+NATURAL_KEY = ["sample_code", "test_code", "analytical_report_code"]
+UPLOAD_FIELDS = {"_id", "uploaded_by", "uploaded_at"}
+
+# Every schema column must be present in the header (values may still be blank unless required)
+REQUIRED_COLUMNS = set(RESULTS_SCHEMA)
+
+
+def read_chunks(file, batch_size=DEFAULT_BATCH_SIZE):
+    # Everything is read as text; the schema decides each column's type
+    return pd.read_csv(file, encoding="utf-8", encoding_errors="replace", dtype=str, chunksize=batch_size)
+
+
+def missing_columns(columns):
+    return REQUIRED_COLUMNS - set(columns)
+
+
+def prepare_chunk(chunk, username, uploaded_at):
+    """Validate and coerce one chunk; returns (documents, their CSV rows, rejects as (row, reason) pairs)."""
+    coerced, reasons = validate(chunk)
+    invalid = reasons != ""
+    # CSV line numbers: chunk indexes continue across chunks and the header is line 1
+    rejects = [(int(row) + 2, reason) for row, reason in reasons[invalid].items()]
+    coerced = coerced[~invalid].copy()
+    coerced["uploaded_by"] = username
+    coerced["uploaded_at"] = uploaded_at
+    # nulls are stored as null, not NaN, so re-uploads compare equal
+    return to_documents(coerced), list(coerced.index + 2), rejects
+
+
+def write_batch(collection, documents, rows):
+    """Unordered bulk insert; returns (inserted, rejects) so one bad row never fails the batch."""
+    if not documents:
+        return 0, []
+    try:
+        result = collection.bulk_write([InsertOne(doc) for doc in documents], ordered=False)
+        inserted, errors = result.inserted_count, []
+    except BulkWriteError as e:
+        inserted, errors = e.details.get("nInserted", 0), e.details.get("writeErrors", [])
+    failed = {err["index"] for err in errors}
+    rollups.apply_changes(rollups.count_changes(doc for i, doc in enumerate(documents) if i not in failed))
+    return inserted, [(rows[err["index"]], err.get("errmsg", "write error")) for err in errors]
+
+
+def _key(doc):
+    return tuple(doc.get(field) for field in NATURAL_KEY)
+
+
+def upsert_batch(collection, documents, rows):
+    """Upsert on NATURAL_KEY; returns (inserted, updated, unchanged, rejects).
+
+    Existing rows for the batch are fetched in one query and compared field by field,
+    so identical rows are skipped without a write and keep their `uploaded_at`.
+    """
+    rejects, latest = [], {}
+    for doc, row in zip(documents, rows):
+        if None in _key(doc):
+            rejects.append((row, "missing " + "/".join(NATURAL_KEY)))
+            continue
+        if _key(doc) in latest:
+            rejects.append((latest[_key(doc)][1], "superseded by a later row with the same key"))
+        latest[_key(doc)] = (doc, row)
+    pending = list(latest.values())
+    if not pending:
+        return 0, 0, 0, rejects
+
+    keys = [dict(zip(NATURAL_KEY, _key(doc))) for doc, _ in pending]
+    existing = {_key(doc): doc for doc in collection.find({"$or": keys}, {"_id": 0, "uploaded_by": 0, "uploaded_at": 0})}
+
+    requests, written, unchanged = [], [], 0
+    for doc, row in pending:
+        fields = {k: v for k, v in doc.items() if k not in UPLOAD_FIELDS}
+        if existing.get(_key(doc)) == fields:
+            unchanged += 1
+            continue
+        requests.append(UpdateOne(dict(zip(NATURAL_KEY, _key(doc))), {"$set": doc}, upsert=True))
+        written.append((doc, row))
+    if not requests:
+        return 0, 0, unchanged, rejects
+
+    try:
+        result = collection.bulk_write(requests, ordered=False)
+        upserted, modified, errors = result.upserted_count, result.modified_count, []
+    except BulkWriteError as e:
+        details = e.details
+        upserted, modified, errors = details.get("nUpserted", 0), details.get("nModified", 0), details.get("writeErrors", [])
+    failed = {err["index"] for err in errors}
+    applied = [doc for i, (doc, _) in enumerate(written) if i not in failed]
+    replaced = [existing[_key(doc)] for doc in applied if _key(doc) in existing]
+    rollups.apply_changes(rollups.count_changes(applied, replaced))
+    rejects += [(written[err["index"]][1], err.get("errmsg", "write error")) for err in errors]
+    return upserted, modified, unchanged, rejects
+
+
+def _key_text(value):
+    # Same text a CSV upload stores for the key (schema "label" columns: 12345.0 -> "12345")
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def normalize_keys(collection, batch_size=DEFAULT_BATCH_SIZE):
+    """Rewrite numeric NATURAL_KEY values from older uploads as text; returns documents changed.
+
+    Uploads before the schema stored whatever pandas inferred, so a report code could be
+    12345 (or 12345.0, NaN) where new uploads store "12345" and never match it. NaN keys
+    are removed, so those rows stay out of the (partial) unique natural key index.
+    """
+    query = {"$or": [{field: {"$type": "number"}} for field in NATURAL_KEY]}
+    changed, requests = 0, []
+    for doc in collection.find(query, {field: 1 for field in NATURAL_KEY}):
+        update = {"$set": {}, "$unset": {}}
+        for field in NATURAL_KEY:
+            value = doc.get(field)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if isinstance(value, float) and math.isnan(value):
+                update["$unset"][field] = ""
+            else:
+                update["$set"][field] = _key_text(value)
+        requests.append(UpdateOne({"_id": doc["_id"]}, {op: fields for op, fields in update.items() if fields}))
+        if len(requests) >= batch_size:
+            changed += collection.bulk_write(requests, ordered=False).modified_count
+            requests = []
+    if requests:
+        changed += collection.bulk_write(requests, ordered=False).modified_count
+    return changed
+
+
+def duplicate_groups(collection):
+    """NATURAL_KEY groups with more than one document, each as {_id: key, ids, count}.
+
+    `ids` are newest first (by `uploaded_at`, then `_id`). Only text keys are grouped, the
+    same documents the partial unique natural key index covers.
+    """
+    pipeline = [
+        {"$match": {field: {"$type": "string"} for field in NATURAL_KEY}},
+        {"$sort": {"uploaded_at": -1, "_id": -1}},
+        {"$group": {
+            "_id": {field: f"${field}" for field in NATURAL_KEY},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    return list(collection.aggregate(pipeline, allowDiskUse=True))
+
+
+def dedupe(collection, batch_size=DEFAULT_BATCH_SIZE):
+    """Keep only the newest document per NATURAL_KEY (see `duplicate_groups`).
+
+    Re-uploads before the upsert path inserted the same result again; the extra copies
+    are deleted and taken out of the daily rollup. Run `normalize_keys` first so legacy
+    numeric keys group with their text versions. Returns the number of documents deleted.
+    """
+    stale = [_id for group in duplicate_groups(collection) for _id in group["ids"][1:]]
+    removed = 0
+    for i in range(0, len(stale), batch_size):
+        batch = stale[i:i + batch_size]
+        documents = list(collection.find({"_id": {"$in": batch}}, {"sample_date": 1, "code": 1, "test": 1, "value": 1}))
+        removed += collection.bulk_write([DeleteMany({"_id": {"$in": batch}})]).deleted_count
+        rollups.apply_changes(rollups.count_changes(removed=documents))
+    return removed
+
+
+def ingest_csv(file, collection, username, batch_size=DEFAULT_BATCH_SIZE, progress=None, upsert=False):
+    """Stream a results CSV into `collection`.
+
+    With `upsert=True` rows are matched on NATURAL_KEY instead of always inserted.
+    `progress(batch_no, inserted, rejected)` is called after each batch. Returns a
+    summary dict with `inserted`, `updated`, `unchanged`, `batches`, `uploaded_at`
+    and `rejects` (a DataFrame of row / reason), or raises ValueError on missing columns.
+    """
+    uploaded_at = datetime.utcnow()
+    inserted, updated, unchanged, batches, rejects = 0, 0, 0, 0, []
+    for chunk in read_chunks(file, batch_size):
+        if batches == 0:
+            missing = missing_columns(chunk.columns)
+            if missing:
+                raise ValueError(f"Missing required columns: {', '.join(sorted(missing))}")
+        documents, rows, chunk_rejects = prepare_chunk(chunk, username, uploaded_at)
+        if upsert:
+            written, changed, same, write_rejects = upsert_batch(collection, documents, rows)
+            updated += changed
+            unchanged += same
+        else:
+            written, write_rejects = write_batch(collection, documents, rows)
+        inserted += written
+        rejects += chunk_rejects + write_rejects
+        batches += 1
+        if progress is not None:
+            progress(batches, inserted, len(rejects))
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": unchanged,
+        "batches": batches,
+        "uploaded_at": uploaded_at,
+        "rejects": pd.DataFrame(rejects, columns=["row", "reason"]),
+    }
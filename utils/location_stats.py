@@ -0,0 +1,149 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from utils.cache import cached
+from utils.data import get_results, DETECTED, UNKNOWN
+
+# 🚨 Per-location risk statistics (by code, sampling point or sub-area): rolling detection
+# rates, positive streaks and time since the last positive. Each level keeps running state
+# per location plus daily counts; new sample days are folded into that state with grouped
+# cumulative sums instead of rescanning the whole history. If an already processed day
+# changes (a re-upload corrected it, even just moving a positive between locations), the
+# level is rebuilt from scratch.
+
+LEVELS = ["code", "points", "sub_area"]
+WINDOWS = [7, 30]
+
+
+class LocationStats:
+    def __init__(self, level):
+        self.level = level
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.through = None  # last sample day folded into the state
+        self.signatures = None  # samples and positives per (day, location) folded in so far
+        self.daily = pd.DataFrame(columns=["day", "location", "detected", "total"])
+        self.state = pd.DataFrame({
+            "samples": pd.Series(dtype="int64"),
+            "positives": pd.Series(dtype="int64"),
+            "last_sample": pd.Series(dtype="datetime64[ns]"),
+            "last_positive": pd.Series(dtype="datetime64[ns]"),
+            "streak": pd.Series(dtype="int64"),
+            "longest_streak": pd.Series(dtype="int64"),
+        })
+        self._source = None
+
+    def _rows(self, df):
+        """Classified samples as (location, day, sample_date, positive), sorted per location."""
+        if self.level not in df.columns or "outcome" not in df.columns:
+            return pd.DataFrame(columns=["location", "day", "sample_date", "positive"])
+        rows = df.loc[
+            df[self.level].notna() & df["sample_date"].notna() & (df["outcome"] != UNKNOWN),
+            [self.level, "sample_date", "outcome"],
+        ]
+        rows = pd.DataFrame({
+            "location": rows[self.level].astype(str).to_numpy(),
+            "day": rows["sample_date"].dt.normalize().to_numpy(),
+            "sample_date": rows["sample_date"].to_numpy(),
+            "positive": (rows["outcome"] == DETECTED).to_numpy(),
+        })
+        return rows.sort_values(["location", "sample_date"], kind="stable").reset_index(drop=True)
+
+    def _fold(self, rows):
+        """Merge samples from days after `through` into the running per-location state."""
+        if rows.empty:
+            return
+        by_location = rows.groupby("location", sort=False)
+        # Streak length at each row: positives since the location's last negative
+        run = (~rows["positive"]).groupby(rows["location"]).cumsum()
+        streaks = rows["positive"].astype(int).groupby([rows["location"], run]).cumsum()
+        new = pd.DataFrame({
+            "samples": by_location.size(),
+            "positives": by_location["positive"].sum(),
+            "last_sample": by_location["sample_date"].max(),
+            "last_positive": rows["sample_date"].where(rows["positive"]).groupby(rows["location"]).max(),
+            "trailing": streaks.groupby(rows["location"]).last(),
+            "leading": (rows["positive"] & (run == 0)).groupby(rows["location"]).sum(),
+            "longest": streaks.groupby(rows["location"]).max(),
+        })
+
+        old = self.state.reindex(self.state.index.union(new.index))
+        new = new.reindex(old.index)
+        seen = new["samples"].notna()
+        old_streak = old["streak"].fillna(0)
+        all_positive = new["positives"] == new["samples"]
+        state = pd.DataFrame(index=old.index)
+        state["samples"] = old["samples"].fillna(0) + new["samples"].fillna(0)
+        state["positives"] = old["positives"].fillna(0) + new["positives"].fillna(0)
+        state["last_sample"] = old["last_sample"].where(~seen, new["last_sample"])
+        state["last_positive"] = new["last_positive"].fillna(old["last_positive"])
+        # A run of positives continues across the boundary unless the new days contain a negative
+        state["streak"] = np.where(
+            seen, np.where(all_positive, old_streak + new["trailing"].fillna(0), new["trailing"].fillna(0)), old_streak
+        )
+        state["longest_streak"] = np.fmax(
+            old["longest_streak"].fillna(0),
+            np.fmax(new["longest"].fillna(0), old_streak + new["leading"].fillna(0)),
+        )
+        for column in ["samples", "positives", "streak", "longest_streak"]:
+            state[column] = state[column].astype("int64")
+        self.state = state
+
+        daily = rows.groupby(["day", "location"], sort=False).agg(
+            detected=("positive", "sum"), total=("positive", "size")
+        ).reset_index()
+        self.daily = pd.concat([self.daily, daily], ignore_index=True) if len(self.daily) else daily
+
+    def update(self, df):
+        """Bring the state up to date with `df`; returns the number of days folded in."""
+        with self._lock:
+            if df is self._source:
+                return 0
+            rows = self._rows(df)
+            signatures = rows.groupby(["day", "location"]).agg(rows=("positive", "size"), positives=("positive", "sum"))
+            if self.through is not None:
+                processed = signatures[signatures.index.get_level_values("day") <= self.through]
+                if not processed.equals(self.signatures):
+                    self._reset()
+            pending = rows if self.through is None else rows[rows["day"] > self.through]
+            self._fold(pending)
+            if len(signatures):
+                self.through = signatures.index.get_level_values("day").max()
+                # Only the longest rolling window needs daily counts
+                self.daily = self.daily[self.daily["day"] > self.through - pd.Timedelta(days=max(WINDOWS))]
+            self.signatures = signatures
+            self._source = df
+            return pending["day"].nunique()
+
+    def table(self):
+        """One row per location with counts, rolling rates, streaks and days since a positive."""
+        with self._lock:
+            state, daily, as_of = self.state.copy(), self.daily, self.through
+        if state.empty:
+            return state
+        for window in WINDOWS:
+            recent = daily[daily["day"] > as_of - pd.Timedelta(days=window)]
+            sums = recent.groupby("location")[["detected", "total"]].sum().reindex(state.index, fill_value=0)
+            state[f"samples_{window}d"] = sums["total"].astype("int64")
+            with np.errstate(divide="ignore", invalid="ignore"):
+                state[f"rate_{window}d"] = (100 * sums["detected"] / sums["total"]).round(1)
+        state["days_since_positive"] = (as_of - state["last_positive"].dt.normalize()).dt.days
+        state["detection_rate"] = (100 * state["positives"] / state["samples"]).round(1)
+        state.index.name = self.level
+        return state.sort_values(
+            [f"rate_{WINDOWS[0]}d", "streak", "days_since_positive"], ascending=[False, False, True]
+        )
+
+
+_engines = {level: LocationStats(level) for level in LEVELS}
+
+
+@cached("location_stats.table")
+def location_stats(level="points"):
+    """Risk table for one of LEVELS, current with the shared results dataset."""
+    engine = _engines[level]
+    engine.update(get_results())
+    return engine.table()
@@ -0,0 +1,42 @@
+
+import numpy as np
+import pandas as pd
+from utils.cache import FrameDayCache
+
+# 🕓 Per-point sample history for the map hover text. The window is sorted by
+# (points, sample_date) and each sample's history line is formatted once; a date
+# selection is then a boolean window over those arrays plus one grouped join. Results
+# are cached per (window frame, date), so switching back to a date is a lookup.
+
+HISTORY_DAYS = 15
+SEPARATOR = "<br>&nbsp;&nbsp;"
+STATUS_HTML = {1: '<b style="color:red">Positive</b>', 0: '<b style="color:green">Negative</b>'}
+
+
+class PointHistory:
+    def __init__(self, df):
+        ordered = df.dropna(subset=["sample_date"]).sort_values(["points", "sample_date"], kind="stable")
+        status = np.select(
+            [ordered["outcome"] == 1, ordered["outcome"] == 0],
+            [STATUS_HTML[1], STATUS_HTML[0]],
+            "Unknown",
+        )
+        self.days = ordered["sample_date"].dt.normalize().to_numpy()
+        self.points = ordered["points"].astype(str).to_numpy()
+        self.lines = (ordered["sample_date"].dt.strftime("%Y-%m-%d") + ": " + status).to_numpy()
+
+    def for_date(self, selected_date):
+        """Series of point -> history HTML for the HISTORY_DAYS ending on `selected_date`."""
+        day = pd.Timestamp(selected_date).normalize()
+        start = (day - pd.Timedelta(days=HISTORY_DAYS - 1)).to_datetime64()
+        window = (self.days >= start) & (self.days <= day.to_datetime64())
+        lines = pd.Series(self.lines[window], index=self.points[window])
+        return lines.groupby(level=0, sort=False).agg(SEPARATOR.join)
+
+
+_histories = FrameDayCache()
+
+
+def get_point_history(window_df, selected_date):
+    """History lookup for `selected_date`, built once per cached map window and date."""
+    return _histories.get(window_df, selected_date, lambda day: PointHistory(window_df).for_date(day))
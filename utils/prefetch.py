@@ -0,0 +1,72 @@
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from utils import aggregations
+from utils.cache import data_version
+from utils.data import results, map_dates, load_map_window
+from utils.location_stats import location_stats
+from utils.map_history import HISTORY_DAYS
+
+# 🚀 Warms the shared dataset and result cache in the background right after login, so the
+# first visit to each page hits a warm cache. Calls use exactly the arguments each page
+# passes with its default filters, since the cache is keyed on them. Pages arriving while a
+# computation is still running wait for it (see utils/cache.py) instead of repeating it.
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 4
+# Logins within this many seconds of a prefetch on the same data version don't repeat it
+MIN_INTERVAL_SECONDS = 60
+
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="prefetch")
+_lock = threading.Lock()
+_last = (None, 0.0)  # (data version, monotonic time) of the last prefetch
+
+
+def _run(task, *args):
+    try:
+        task(*args)
+    except Exception as e:
+        # A failed warm-up only means the page computes it on first visit
+        logger.warning("Prefetch of %s failed: %s", getattr(task, "__name__", task), e)
+
+
+def _page_defaults():
+    min_date, max_date = aggregations.date_bounds()
+    if min_date is None:
+        return
+    # Overview / Test Visuals: full range from st.date_input (datetime.date values)
+    first, last = min_date.date(), max_date.date()
+    _pool.submit(_run, aggregations.counts_by_date_outcome, first, last)
+    _pool.submit(_run, aggregations.counts_by_code_value, first, last)
+    # Trend Analysis: latest weeks, converted back with pd.to_datetime on the page
+    start = pd.to_datetime(aggregations.default_trend_start(min_date, max_date).date())
+    end = pd.to_datetime(last)
+    _pool.submit(_run, aggregations.counts_by_date_outcome, start, end)
+    _pool.submit(_run, aggregations.rolling_detection, start, end, aggregations.DEFAULT_ROLLING_DAYS)
+
+
+def _map_defaults():
+    dates = map_dates()
+    if dates:
+        load_map_window(dates[0], HISTORY_DAYS)
+
+
+def start_prefetch():
+    """Queue the warm-up tasks and return immediately."""
+    global _last
+    with _lock:
+        version, started = _last
+        if version == data_version() and time.monotonic() - started < MIN_INTERVAL_SECONDS:
+            return False
+        _last = (data_version(), time.monotonic())
+    _pool.submit(_run, results.get)
+    _pool.submit(_run, _page_defaults)
+    _pool.submit(_run, aggregations.detections_by_test)
+    _pool.submit(_run, location_stats, "points")
+    _pool.submit(_run, _map_defaults)
+    return True
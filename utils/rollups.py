@@ -0,0 +1,105 @@
+
+import sys
+from collections import Counter
+from datetime import datetime
+
+from pymongo import UpdateOne
+from utils.db import RESULTS_COLLECTION, ROLLUP_COLLECTION, get_collection
+from utils.data import DETECTED_LABEL, NOT_DETECTED_LABEL
+
+# 📆 Materialized daily counts (date × code × test × Detection → count) kept current by
+# the upload path with `$inc` upserts, so time-series charts read a few hundred rollup
+# rows instead of every swab result.
+#   python -m utils.rollups --rebuild   recompute the whole rollup from `fresh`
+# Only writes made through utils/ingest.py update the rollup; results inserted any other
+# way (mongoimport, scripts, the shell) need a rebuild. Until a rebuild has written the
+# completeness marker, the dashboards aggregate the raw results instead.
+
+KEY_FIELDS = ["date", "code", "test", "Detection"]
+# Marker document written by `rebuild()` (it has no `date`, so rollup queries skip it)
+COMPLETE_MARKER = "_complete"
+
+_complete = False
+
+
+def rollup_key(doc):
+    """Rollup key for one result document, or None when it has no sample date."""
+    sample_date = doc.get("sample_date")
+    if not isinstance(sample_date, datetime):
+        return None
+    detection = NOT_DETECTED_LABEL if doc.get("value") == NOT_DETECTED_LABEL else DETECTED_LABEL
+    day = datetime(sample_date.year, sample_date.month, sample_date.day)
+    return (day, doc.get("code"), doc.get("test"), detection)
+
+
+def count_changes(added=(), removed=()):
+    """Net count change per rollup key for documents written and the versions they replaced."""
+    deltas = Counter()
+    for doc in added:
+        key = rollup_key(doc)
+        if key is not None:
+            deltas[key] += 1
+    for doc in removed:
+        key = rollup_key(doc)
+        if key is not None:
+            deltas[key] -= 1
+    return deltas
+
+
+def apply_changes(deltas):
+    requests = [
+        UpdateOne(dict(zip(KEY_FIELDS, key)), {"$inc": {"count": n}}, upsert=True)
+        for key, n in deltas.items() if n
+    ]
+    if requests:
+        get_collection(ROLLUP_COLLECTION).bulk_write(requests, ordered=False)
+    return len(requests)
+
+
+def is_complete():
+    """True once the rollup is known to count every result in `fresh`."""
+    global _complete
+    if not _complete:
+        if get_collection(ROLLUP_COLLECTION).find_one({"_id": COMPLETE_MARKER}, {"_id": 1}) is not None:
+            _complete = True
+        elif get_collection(RESULTS_COLLECTION).find_one({}, {"_id": 1}) is None:
+            # Nothing to count yet: every later upload goes through the $inc path
+            mark_complete()
+    return _complete
+
+
+def mark_complete():
+    global _complete
+    get_collection(ROLLUP_COLLECTION).replace_one(
+        {"_id": COMPLETE_MARKER}, {"built_at": datetime.utcnow()}, upsert=True
+    )
+    _complete = True
+
+
+def rebuild():
+    """Recompute the rollup from the raw results; `$out` swaps it in atomically."""
+    get_collection(RESULTS_COLLECTION).aggregate([
+        {"$match": {"sample_date": {"$type": "date"}}},
+        {"$group": {
+            "_id": {
+                "date": {"$dateFromString": {
+                    "dateString": {"$dateToString": {"format": "%Y-%m-%d", "date": "$sample_date"}},
+                }},
+                "code": "$code",
+                "test": "$test",
+                "Detection": {"$cond": [{"$eq": ["$value", NOT_DETECTED_LABEL]}, NOT_DETECTED_LABEL, DETECTED_LABEL]},
+            },
+            "count": {"$sum": 1},
+        }},
+        {"$project": {"_id": 0, **{field: f"$_id.{field}" for field in KEY_FIELDS}, "count": 1}},
+        {"$out": ROLLUP_COLLECTION},
+    ])
+    mark_complete()
+    return get_collection(ROLLUP_COLLECTION).count_documents({"date": {"$exists": True}})
+
+
+if __name__ == "__main__":
+    if "--rebuild" in sys.argv[1:]:
+        print(f"{ROLLUP_COLLECTION}: {rebuild()} rows")
+    else:
+        print("usage: python -m utils.rollups --rebuild")
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# 📐 Declarative schema for uploaded results. Every column is coerced once at ingest with
+# whole-column operations, so documents land in MongoDB with canonical BSON types (dates,
+# ints, doubles, trimmed strings, one spelling per result value) and readers don't have to
+# re-coerce. Rows that fail a check are reported with every reason that applies.
+
+DATE_FORMAT = "%d-%m-%Y"
+
+# Canonical result values and the spellings accepted for them (compared case-insensitively)
+VALUE_VOCABULARY = {
+    "Detected": ["detected", "positive", "pos", "d"],
+    "Not Detected": ["not detected", "not-detected", "notdetected", "negative", "neg", "nd", "n.d."],
+}
+
+
+class Field:
+    """One column: `kind` is str, label, int, float, date or choice; `required` forbids blanks."""
+
+    def __init__(self, kind="str", required=False, choices=None):
+        self.kind = kind
+        self.required = required
+        self.choices = choices
+
+
+RESULTS_SCHEMA = {
+    "sample_code": Field("label", required=True),
+    "sample_description": Field(),
+    "translated_description": Field(),
+    "test_code": Field("label", required=True),
+    "test_result": Field(),
+    "unit": Field(),
+    "analytical_report_code": Field("label", required=True),
+    "sample_date": Field("date", required=True),
+    "location_code": Field(),
+    "fresh_smoked": Field(),
+    "sub_area": Field(),
+    "before_during": Field(),
+    "value": Field("choice", required=True, choices=VALUE_VOCABULARY),
+    "week_num": Field("int"),
+    "week": Field(),
+    "x": Field("float"),
+    "y": Field("float"),
+    "points": Field("label"),
+}
+
+
+def _blank(values):
+    return values.isna() | (values.astype(str).str.strip() == "")
+
+
+def _coerce_column(values, field):
+    """(coerced column, mask of present values that could not be coerced)."""
+    text = values.astype("string").str.strip()
+    text = text.mask((text == "").fillna(False))
+    if field.kind == "date":
+        coerced = pd.to_datetime(text, format=DATE_FORMAT, errors="coerce")
+    elif field.kind in ("int", "float"):
+        coerced = pd.to_numeric(text, errors="coerce").astype("float64")
+        if field.kind == "int":
+            whole = coerced.notna() & (coerced == np.floor(coerced))
+            coerced = coerced.where(whole).astype("Int64")
+    elif field.kind == "choice":
+        aliases = {alias: canonical for canonical, spellings in field.choices.items() for alias in spellings}
+        aliases.update({canonical.casefold(): canonical for canonical in field.choices})
+        coerced = text.str.casefold().map(aliases).astype(object)
+    elif field.kind == "label":
+        # Identifiers that spreadsheets turn into numbers ("12.0") go back to their text ("12")
+        coerced = text.str.replace(r"^(\d+)\.0+$", r"\1", regex=True)
+    else:
+        coerced = text
+    return coerced, text.notna() & coerced.isna()
+
+
+def validate(chunk, schema=RESULTS_SCHEMA):
+    """Coerce `chunk` to `schema`; returns (coerced frame, Series of reject reasons per row).
+
+    Rows without problems have an empty reason. Columns outside the schema are kept as
+    trimmed strings.
+    """
+    coerced = pd.DataFrame(index=chunk.index)
+    reasons = pd.Series("", index=chunk.index, dtype=object)
+
+    def reject(mask, reason):
+        reasons[mask] = reasons[mask] + np.where(reasons[mask] == "", "", "; ") + reason
+
+    for column in chunk.columns:
+        field = schema.get(column, Field())
+        values, invalid = _coerce_column(chunk[column], field)
+        coerced[column] = values
+        if invalid.any():
+            reject(invalid, f"invalid {column}")
+        if field.required:
+            missing = _blank(chunk[column])
+            if missing.any():
+                reject(missing, f"missing {column}")
+    return coerced, reasons
+
+
+def to_documents(frame):
+    """Records with Python / BSON-ready values (None for blanks, no NaN or NA)."""
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).to_dict(orient="records")
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+from utils.cache import FrameDayCache
+
+# 📍 Uniform grid index over map point coordinates (floor plan pixels). Points are sorted
+# by (cell column, cell row) once, so every grid column is one contiguous slice and a
+# viewport or neighbourhood query is a handful of binary searches plus an exact mask.
+
+# Average number of points per grid cell when the cell size is picked automatically
+POINTS_PER_CELL = 4
+# Clusters across the visible width; zooming in shrinks the cells, so clusters split up
+CLUSTER_COLUMNS = 40
+# Above this many visible points the map switches to clusters (in "Auto" mode)
+CLUSTER_MIN_POINTS = 300
+
+
+class GridIndex:
+    def __init__(self, x, y, cell_size=None):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        valid = np.flatnonzero(np.isfinite(self.x) & np.isfinite(self.y))
+        if cell_size is None:
+            extent = max(np.ptp(self.x[valid]), np.ptp(self.y[valid])) if len(valid) else 1.0
+            cell_size = extent / max(np.sqrt(len(valid) / POINTS_PER_CELL), 1.0)
+        self.cell_size = max(float(cell_size), 1.0)
+
+        cols = np.floor(self.x[valid] / self.cell_size).astype(np.int64)
+        rows = np.floor(self.y[valid] / self.cell_size).astype(np.int64)
+        self._col0 = cols.min() if len(valid) else 0
+        self._row0 = rows.min() if len(valid) else 0
+        self._stride = (rows.max() - self._row0 + 1) if len(valid) else 1
+        self._ncols = (cols.max() - self._col0 + 1) if len(valid) else 0
+        keys = (cols - self._col0) * self._stride + (rows - self._row0)
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._positions = valid[order]
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _cell(self, value, origin):
+        return int(np.floor(value / self.cell_size)) - origin
+
+    def _candidates(self, col_lo, col_hi, row_lo, row_hi):
+        """Positions of the points in the cells between the given (inclusive) bounds."""
+        col_lo, col_hi = max(col_lo, 0), min(col_hi, self._ncols - 1)
+        row_lo, row_hi = max(row_lo, 0), min(row_hi, self._stride - 1)
+        if col_lo > col_hi or row_lo > row_hi:
+            return np.empty(0, dtype=np.int64)
+        cols = np.arange(col_lo, col_hi + 1, dtype=np.int64)
+        starts = np.searchsorted(self._keys, cols * self._stride + row_lo, side="left")
+        ends = np.searchsorted(self._keys, cols * self._stride + row_hi, side="right")
+        return np.concatenate([self._positions[s:e] for s, e in zip(starts, ends)])
+
+    def viewport(self, x0, x1, y0, y1):
+        """Sorted row positions of the points inside the rectangle [x0, x1] x [y0, y1]."""
+        found = self._candidates(
+            self._cell(x0, self._col0), self._cell(x1, self._col0),
+            self._cell(y0, self._row0), self._cell(y1, self._row0),
+        )
+        inside = (self.x[found] >= x0) & (self.x[found] <= x1) & (self.y[found] >= y0) & (self.y[found] <= y1)
+        return np.sort(found[inside])
+
+    def nearest(self, x, y):
+        """(row position, distance) of the point closest to (x, y), or (None, inf) if empty."""
+        if not len(self):
+            return None, np.inf
+        col, row = self._cell(x, self._col0), self._cell(y, self._row0)
+        best, best_distance = None, np.inf
+        # Grow square rings of cells until the ring lies further away than the best hit
+        for ring in range(max(self._ncols, self._stride) + abs(col) + abs(row) + 1):
+            if best is not None and (ring - 1) * self.cell_size > best_distance:
+                break
+            found = self._candidates(col - ring, col + ring, row - ring, row + ring)
+            if not len(found):
+                continue
+            distances = np.hypot(self.x[found] - x, self.y[found] - y)
+            i = int(np.argmin(distances))
+            if distances[i] < best_distance:
+                best, best_distance = int(found[i]), float(distances[i])
+        return best, best_distance
+
+    def clusters(self, positions, cell_size, outcome=None):
+        """Group `positions` into square clusters of `cell_size` pixels.
+
+        Returns one row per non-empty cluster with its centroid, member count, number of
+        positive members (when `outcome` codes are given) and the member row positions.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        frame = pd.DataFrame({
+            "cell_x": np.floor(self.x[positions] / cell_size).astype(np.int64),
+            "cell_y": np.floor(self.y[positions] / cell_size).astype(np.int64),
+            "x": self.x[positions],
+            "y": self.y[positions],
+            "positives": (np.asarray(outcome)[positions] == 1) if outcome is not None else False,
+            "position": positions,
+        })
+        grouped = frame.groupby(["cell_x", "cell_y"], sort=False)
+        clustered = grouped.agg(
+            x=("x", "mean"), y=("y", "mean"), count=("position", "size"), positives=("positives", "sum")
+        )
+        clustered["members"] = grouped["position"].agg(list)
+        return clustered.reset_index(drop=True)
+
+
+def cluster_size(x0, x1, columns=CLUSTER_COLUMNS):
+    """Cluster cell size for a viewport spanning x0..x1 (smaller when zoomed in)."""
+    return max((x1 - x0) / columns, 1.0)
+
+
+def _day_index(window_df, day):
+    frame = window_df[window_df["sample_date"].dt.normalize() == day].reset_index(drop=True)
+    return frame, GridIndex(frame["x"], frame["y"])
+
+
+_indexes = FrameDayCache()
+
+
+def get_day_index(window_df, selected_date):
+    """(day frame, GridIndex) for `selected_date`, built once per cached map window and day."""
+    return _indexes.get(window_df, selected_date, lambda day: _day_index(window_df, day))
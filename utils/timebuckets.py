@@ -0,0 +1,43 @@
+
+import pandas as pd
+
+# 📏 Time bucketing for the time-series charts: the resolution is picked from the selected
+# range so a chart never carries more than MAX_BUCKETS points per series, however much
+# history accumulates. Weeks are ISO weeks (Monday start), matching `week_num` / `week`.
+
+RESOLUTIONS = {"Day": "D", "Week": "W-SUN", "Month": "M"}
+TICK_FORMATS = {"Day": "%d-%b", "Week": "%d-%b", "Month": "%b %Y"}
+MAX_BUCKETS = 120
+# Above this many points per figure, line charts switch to WebGL rendering
+WEBGL_MIN_POINTS = 1000
+
+
+def auto_resolution(start, end, max_buckets=MAX_BUCKETS):
+    days = (pd.to_datetime(end) - pd.to_datetime(start)).days + 1
+    if days <= max_buckets:
+        return "Day"
+    if days / 7 <= max_buckets:
+        return "Week"
+    return "Month"
+
+
+def resolve(choice, start, end):
+    """`choice` from a selector ("Auto", "Day", "Week", "Month") to a concrete resolution."""
+    return auto_resolution(start, end) if choice == "Auto" else choice
+
+
+def bucket_counts(counts, resolution, date_col="sample_date", count_col="count"):
+    """Re-aggregate per-day counts into `resolution` buckets labelled by their start date."""
+    if resolution == "Day" or counts.empty:
+        return counts
+    keys = [col for col in counts.columns if col not in (date_col, count_col)]
+    starts = counts[date_col].dt.to_period(RESOLUTIONS[resolution]).dt.start_time
+    return (
+        counts.assign(**{date_col: starts})
+        .groupby([date_col, *keys], as_index=False)[count_col]
+        .sum()
+    )
+
+
+def render_mode(points):
+    return "webgl" if points > WEBGL_MIN_POINTS else "svg"
@@ -0,0 +1,85 @@
+
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+# ⏱️ Lightweight per-stage timing for the dashboard pages. Spans are kept in a rolling
+# in-process store (the last WINDOW per page and stage) and summarized on the
+# admin Performance page.
+
+WINDOW = 500
+
+_lock = threading.Lock()
+_spans = defaultdict(lambda: deque(maxlen=WINDOW))
+
+
+class Span:
+    def __init__(self, page, stage):
+        self.page = page
+        self.stage = stage
+        self.rows = None
+        self.bytes = None
+        self.ms = None
+
+    def record(self, data):
+        """Note row count and in-memory size of `data` (a DataFrame or sized object); returns it."""
+        if isinstance(data, pd.DataFrame):
+            self.rows = len(data)
+            self.bytes = int(data.memory_usage(index=True).sum())
+        elif hasattr(data, "__len__"):
+            self.rows = len(data)
+        return data
+
+
+@contextmanager
+def span(page, stage):
+    current = Span(page, stage)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.ms = (time.perf_counter() - start) * 1000
+        with _lock:
+            _spans[(page, stage)].append((time.time(), current.ms, current.rows, current.bytes))
+
+
+def timed(page, stage):
+    """Decorator form of `span`; records the returned value's rows/bytes."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(page, stage) as current:
+                return current.record(func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def summary():
+    """One row per page and stage: call count, p50/p95/max latency, last rows/bytes."""
+    with _lock:
+        snapshot = {key: list(values) for key, values in _spans.items()}
+    rows = []
+    for (page, stage), values in snapshot.items():
+        ms = pd.Series([value[1] for value in values])
+        _, _, last_rows, last_bytes = values[-1]
+        rows.append({
+            "page": page,
+            "stage": stage,
+            "calls": len(values),
+            "p50 (ms)": round(ms.quantile(0.5), 1),
+            "p95 (ms)": round(ms.quantile(0.95), 1),
+            "max (ms)": round(ms.max(), 1),
+            "last rows": last_rows,
+            "last bytes": last_bytes,
+        })
+    columns = ["page", "stage", "calls", "p50 (ms)", "p95 (ms)", "max (ms)", "last rows", "last bytes"]
+    return pd.DataFrame(rows, columns=columns).sort_values(["page", "stage"]).reset_index(drop=True)
+
+
+def reset():
+    with _lock:
+        _spans.clear()